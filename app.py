@@ -2,11 +2,11 @@ from flask import Flask, render_template, request, jsonify
 import os
 from datetime import datetime
 from main import UHINEligibilityChecker
-from dotenv import load_dotenv
+from env_bootstrap import ensure_env_loaded
 import re
 
 # Load environment variables
-load_dotenv('.env.local')
+ensure_env_loaded()
 
 app = Flask(__name__)
 
@@ -22,6 +22,10 @@ config = {
     'provider_last': os.getenv('PROVIDER_LAST_NAME')
 }
 
+# One checker per process so every request reuses the same SOAP session
+# (and its keep-alive TLS connection to UHIN) instead of opening a new one
+checker = UHINEligibilityChecker(config)
+
 def parse_detailed_271(raw_response):
     """Parse detailed information from X12 271 response"""
     details = {
@@ -181,9 +185,6 @@ def check_eligibility():
                 'error': 'Please provide all required fields'
             }), 400
         
-        # Initialize checker
-        checker = UHINEligibilityChecker(config)
-        
         # Try to guess gender from first name for better matching
         # This is a simple heuristic - could be improved
         gender = 'U'
@@ -67,7 +67,8 @@ def check_eligibility():
         date_of_birth=dob,
         gender=gender,
         test_mode=False,
-        save_files=False
+        save_files=False,
+        keep_raw=True  # Raw segments feed raw_response_summary below
     )
 
     # Parse result
@@ -0,0 +1,22 @@
+"""
+Environment Bootstrap for UHIN Eligibility Checking
+Loads .env.local once per process for every entry point and test script
+"""
+
+from dotenv import load_dotenv
+
+# Dotenv files already read in this process. Module state (not os.environ), so
+# child processes such as parse_many's workers still load the file themselves
+_LOADED = set()
+
+
+def ensure_env_loaded(path: str = '.env.local'):
+    """
+    Load environment variables from the dotenv file unless already loaded
+
+    Args:
+        path: Dotenv file to read (defaults to .env.local)
+    """
+    if path not in _LOADED:
+        load_dotenv(path)
+        _LOADED.add(path)
@@ -7,12 +7,14 @@ This script demonstrates how to use the eligibility checker in your own code.
 
 import os
 from datetime import datetime
-from main import UHINEligibilityChecker
 
 
 def basic_example():
     """Basic example of checking a single patient's eligibility"""
     
+    # Imported here so the offline build/parse examples don't pull in the SOAP stack
+    from main import UHINEligibilityChecker
+    
     # Option 1: Use environment variables for credentials
     # Set these in your .env file or shell:
     # export UHIN_USERNAME='your_username'
@@ -71,6 +73,8 @@ def basic_example():
 def batch_example():
     """Example of checking multiple patients"""
     
+    from main import UHINEligibilityChecker
+    
     # Create checker instance (credentials from environment)
     checker = UHINEligibilityChecker()
     
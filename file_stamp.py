@@ -0,0 +1,32 @@
+"""
+Output File Name Stamps for UHIN Eligibility Checking
+Shared by every checker that saves X12 270/271 messages to disk
+"""
+
+import threading
+import time
+
+# File-name stamp cache: strftime only runs once per wall-clock second
+_stamp_lock = threading.Lock()
+_stamp_second = None
+_stamp_text = ''
+_stamp_seq = 0
+
+
+def now_stamp() -> str:
+    """
+    Return a YYYYMMDD_HHMMSS stamp for output file names
+
+    Calls within the same second get a counter suffix (_1, _2, ...) so
+    back-to-back or concurrent patients never overwrite each other's files.
+    """
+    global _stamp_second, _stamp_text, _stamp_seq
+    second = int(time.time())
+    with _stamp_lock:
+        if second != _stamp_second:
+            _stamp_second = second
+            _stamp_text = time.strftime('%Y%m%d_%H%M%S', time.localtime(second))
+            _stamp_seq = 0
+            return _stamp_text
+        _stamp_seq += 1
+        return f"{_stamp_text}_{_stamp_seq}"
@@ -3,32 +3,41 @@ Main Orchestration Module for UHIN Utah Medicaid Eligibility Checking
 Coordinates the X12 270 building, SOAP communication, and X12 271 parsing
 """
 
+import io
 import os
 import json
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 from pathlib import Path
-from dotenv import load_dotenv
 
 from x12_builder import X12_270Builder
 from soap_client import SOAPClient
 from parser import X12_271Parser
+from env_bootstrap import ensure_env_loaded
+from file_stamp import now_stamp
 
-# Load environment variables from .env.local
-load_dotenv('.env.local')
+# Load environment variables from .env.local (once per process)
+ensure_env_loaded()
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Configure logging (leave it alone if the host application already has).
+# Defaults to WARNING so batch runs don't pay for per-patient INFO records;
+# set UHIN_LOG_LEVEL=INFO for step-by-step progress.
+if not logging.getLogger().handlers:
+    logging.basicConfig(
+        level=os.getenv('UHIN_LOG_LEVEL', 'WARNING').upper(),
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
 logger = logging.getLogger(__name__)
 
-
 class UHINEligibilityChecker:
     """Main orchestrator for Utah Medicaid eligibility checking via UHIN"""
     
+    # Concurrent UHIN requests in check_eligibility_batch (kept within the
+    # SOAP client's connection pool so every worker gets a kept-alive socket)
+    BATCH_MAX_WORKERS = 8
+    
     def __init__(self, config: Optional[Dict[str, str]] = None):
         """
         Initialize the eligibility checker
@@ -53,6 +62,8 @@ class UHINEligibilityChecker:
         # Create output directory for logs/responses
         self.output_dir = Path("output")
         self.output_dir.mkdir(exist_ok=True)
+        # Plain-string prefix so per-check file names are simple concatenations
+        self._output_dir_str = str(self.output_dir) + os.sep
     
     def _load_config_from_env(self) -> Dict[str, str]:
         """Load configuration from environment variables"""
@@ -73,7 +84,7 @@ class UHINEligibilityChecker:
         missing_fields = [field for field in required_fields if not self.config.get(field)]
         
         if missing_fields:
-            logger.warning(f"Missing required configuration fields: {missing_fields}")
+            logger.warning("Missing required configuration fields: %s", missing_fields)
             logger.info("You can set these via environment variables or pass a config dictionary")
     
     def check_eligibility(self,
@@ -83,7 +94,8 @@ class UHINEligibilityChecker:
                          gender: Optional[str] = 'U',
                          member_id: Optional[str] = None,
                          test_mode: bool = False,
-                         save_files: bool = True) -> Dict[str, any]:
+                         save_files: bool = True,
+                         keep_raw: bool = False) -> Dict[str, any]:
         """
         Check patient eligibility for Utah Medicaid FFS
         
@@ -95,6 +107,8 @@ class UHINEligibilityChecker:
             member_id: Optional Medicaid member ID
             test_mode: If True, uses test environment
             save_files: If True, saves X12 messages to files
+            keep_raw: If True, the parsed details also carry the raw 271
+                segments under 'raw_segments'
             
         Returns:
             Dictionary containing:
@@ -125,7 +139,7 @@ class UHINEligibilityChecker:
                 logger.info("Using PRODUCTION environment (HT000004-001)")
             
             # Step 1: Build X12 270 request
-            logger.info(f"Building X12 270 for {first_name} {last_name}")
+            logger.info("Building X12 270 for %s %s", first_name, last_name)
             x12_270 = self.x12_builder.build(
                 patient_first_name=first_name,
                 patient_last_name=last_name,
@@ -139,17 +153,18 @@ class UHINEligibilityChecker:
             validation_result = self.x12_builder.validate(x12_270)
             if not validation_result['valid']:
                 result['errors'].extend(validation_result['errors'])
-                logger.error(f"X12 270 validation failed: {validation_result['errors']}")
+                logger.error("X12 270 validation failed: %s", validation_result['errors'])
                 return result
             
             # Save X12 270 if requested
             if save_files:
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                x270_filename = self.output_dir / f"x12_270_{last_name}_{first_name}_{timestamp}.txt"
-                with open(x270_filename, 'w') as f:
-                    f.write(x12_270)
-                result['files']['x12_270'] = str(x270_filename)
-                logger.info(f"Saved X12 270 to {x270_filename}")
+                timestamp = now_stamp()
+                x270_filename = self._output_dir_str + f"x12_270_{last_name}_{first_name}_{timestamp}.txt"
+                # Binary write: no newline translation or locale encoding layer
+                with open(x270_filename, 'wb') as f:
+                    f.write(x12_270.encode('utf-8'))
+                result['files']['x12_270'] = x270_filename
+                logger.info("Saved X12 270 to %s", x270_filename)
             
             # Step 2: Send SOAP request
             logger.info("Sending SOAP request to UHIN...")
@@ -159,21 +174,21 @@ class UHINEligibilityChecker:
                 result['errors'].append(soap_result.get('error', 'SOAP request failed'))
                 if soap_result.get('soap_fault'):
                     result['soap_fault'] = soap_result['soap_fault']
-                logger.error(f"SOAP request failed: {soap_result.get('error')}")
+                logger.error("SOAP request failed: %s", soap_result.get('error'))
                 return result
             
             # Save X12 271 response if received
             x12_271 = soap_result.get('x12_271')
             if x12_271 and save_files:
-                x271_filename = self.output_dir / f"x12_271_{last_name}_{first_name}_{timestamp}.txt"
-                with open(x271_filename, 'w') as f:
-                    f.write(x12_271)
-                result['files']['x12_271'] = str(x271_filename)
-                logger.info(f"Saved X12 271 to {x271_filename}")
+                x271_filename = self._output_dir_str + f"x12_271_{last_name}_{first_name}_{timestamp}.txt"
+                with open(x271_filename, 'wb') as f:
+                    f.write(x12_271.encode('utf-8'))
+                result['files']['x12_271'] = x271_filename
+                logger.info("Saved X12 271 to %s", x271_filename)
             
             # Step 3: Parse X12 271 response
             logger.info("Parsing X12 271 response...")
-            parsed_result = self.x12_parser.parse(x12_271)
+            parsed_result = self.x12_parser.parse(x12_271, keep_raw=keep_raw)
             
             # Update result with parsed data
             result['success'] = parsed_result.get('success', False)
@@ -190,96 +205,171 @@ class UHINEligibilityChecker:
                 ])
             
             # Log summary
-            logger.info(f"Eligibility check complete: {parsed_result.get('summary', 'No summary')}")
+            logger.info("Eligibility check complete: %s", parsed_result.get('summary', 'No summary'))
             
             # Save parsed result if requested
             if save_files:
-                parsed_filename = self.output_dir / f"parsed_result_{last_name}_{first_name}_{timestamp}.json"
+                parsed_filename = self._output_dir_str + f"parsed_result_{last_name}_{first_name}_{timestamp}.json"
+                # The raw 271 is already saved to files['x12_271']; don't JSON-escape it a second time
+                result_to_persist = {k: v for k, v in result.items() if k != 'raw_271_response'}
+                # Encode in one call and write once (json.dump issues a write per token)
                 with open(parsed_filename, 'w') as f:
-                    json.dump(result, f, indent=2)
-                result['files']['parsed_result'] = str(parsed_filename)
-                logger.info(f"Saved parsed result to {parsed_filename}")
+                    f.write(json.dumps(result_to_persist, indent=2))
+                result['files']['parsed_result'] = parsed_filename
+                logger.info("Saved parsed result to %s", parsed_filename)
             
         except Exception as e:
-            logger.error(f"Unexpected error during eligibility check: {str(e)}", exc_info=True)
+            logger.error("Unexpected error during eligibility check: %s", e, exc_info=True)
             result['errors'].append(f"System error: {str(e)}")
         
         return result
     
-    def check_eligibility_batch(self, patients: list, test_mode: bool = False) -> list:
+    def _validate_patient(self, patient: Dict) -> List[str]:
+        """
+        Check a batch patient record before any X12 is built or sent
+        
+        Returns:
+            List of problems found (empty if the record is usable)
+        """
+        errors = []
+        
+        # Records come from CSV/JSON, so any field may be missing or not a str
+        for field in ('first_name', 'last_name'):
+            if not str(patient.get(field) or '').strip():
+                errors.append(f"Missing {field}")
+        
+        dob = str(patient.get('date_of_birth') or '')
+        dob_format = {10: '%Y-%m-%d', 8: '%Y%m%d'}.get(len(dob))
+        valid_dob = dob_format is not None
+        if valid_dob:
+            try:
+                datetime.strptime(dob, dob_format)
+            except ValueError:
+                valid_dob = False
+        if not valid_dob:
+            errors.append(f"Invalid date_of_birth: {dob!r} (expected YYYY-MM-DD or YYYYMMDD)")
+        
+        # The builder upper-cases the gender, so 'm'/'f'/'u' are accepted
+        gender = str(patient.get('gender') or 'U').upper()
+        if gender not in ('M', 'F', 'U'):
+            errors.append(f"Invalid gender: {gender!r} (expected M, F or U)")
+        
+        return errors
+    
+    def check_eligibility_batch(self, patients: list, test_mode: bool = False,
+                                max_workers: Optional[int] = None) -> list:
         """
         Check eligibility for multiple patients
         
+        Every record is validated first; invalid ones get an error result
+        without building an X12 270 or calling UHIN. Valid patients are
+        checked concurrently, since each check is mostly waiting on UHIN.
+        
         Args:
             patients: List of patient dictionaries with first_name, last_name, date_of_birth
             test_mode: If True, uses test environment
+            max_workers: Concurrent requests (defaults to BATCH_MAX_WORKERS;
+                1 checks patients one at a time)
             
         Returns:
-            List of results for each patient
+            List of results for each patient, in input order
         """
-        results = []
+        validation_errors = [self._validate_patient(patient) for patient in patients]
+        invalid_count = sum(1 for errors in validation_errors if errors)
+        if invalid_count:
+            logger.warning("Skipping %d of %d patients with invalid input", invalid_count, len(patients))
         
-        for i, patient in enumerate(patients, 1):
-            logger.info(f"Processing patient {i}/{len(patients)}: {patient.get('first_name')} {patient.get('last_name')}")
-            
-            result = self.check_eligibility(
-                first_name=patient.get('first_name'),
-                last_name=patient.get('last_name'),
-                date_of_birth=patient.get('date_of_birth'),
-                gender=patient.get('gender', 'U'),
+        results = [None] * len(patients)
+        pending = []
+        
+        for i, (patient, errors) in enumerate(zip(patients, validation_errors)):
+            if errors:
+                results[i] = {
+                    'patient': patient,
+                    'result': {
+                        'success': False,
+                        'qualified_for_cm': False,
+                        'ffs_status': 'UNKNOWN',
+                        'eligibility_details': {},
+                        'errors': errors,
+                        'files': {},
+                        'timestamp': datetime.now().isoformat()
+                    }
+                }
+            else:
+                pending.append(i)
+        
+        def check(i: int) -> Dict:
+            patient = patients[i]
+            logger.info("Processing patient %d/%d: %s %s", i + 1, len(patients),
+                        patient.get('first_name'), patient.get('last_name'))
+            return self.check_eligibility(
+                first_name=str(patient['first_name']),
+                last_name=str(patient['last_name']),
+                date_of_birth=str(patient['date_of_birth']),
+                gender=str(patient.get('gender') or 'U').upper(),
                 member_id=patient.get('member_id'),
                 test_mode=test_mode
             )
-            
-            results.append({
-                'patient': patient,
+        
+        workers = min(max_workers or self.BATCH_MAX_WORKERS, len(pending))
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='uhin-batch') as pool:
+                checked = list(pool.map(check, pending))
+        else:
+            checked = [check(i) for i in pending]
+        
+        for i, result in zip(pending, checked):
+            results[i] = {
+                'patient': patients[i],
                 'result': result
-            })
+            }
         
         return results
     
     def format_result_summary(self, result: Dict) -> str:
         """Format a result dictionary as a readable summary"""
         
-        lines = []
-        lines.append("\n" + "="*60)
-        lines.append("ELIGIBILITY CHECK RESULT SUMMARY")
-        lines.append("="*60)
+        buf = io.StringIO()
+        w = buf.write
+        rule = "=" * 60
+        
+        w(f"\n{rule}\nELIGIBILITY CHECK RESULT SUMMARY\n{rule}\n")
         
-        lines.append(f"\nTimestamp: {result.get('timestamp', 'N/A')}")
-        lines.append(f"Success: {'✅ YES' if result.get('success') else '❌ NO'}")
+        w(f"\nTimestamp: {result.get('timestamp', 'N/A')}\n")
+        w(f"Success: {'✅ YES' if result.get('success') else '❌ NO'}\n")
         
         if result.get('success'):
-            lines.append(f"\nQualifies for CM Program: {'✅ YES' if result.get('qualified_for_cm') else '❌ NO'}")
-            lines.append(f"FFS Status: {result.get('ffs_status', 'UNKNOWN')}")
+            w(f"\nQualifies for CM Program: {'✅ YES' if result.get('qualified_for_cm') else '❌ NO'}\n")
+            w(f"FFS Status: {result.get('ffs_status', 'UNKNOWN')}\n")
             
             details = result.get('eligibility_details', {})
             if details.get('summary'):
-                lines.append(f"\nSummary: {details['summary']}")
+                w(f"\nSummary: {details['summary']}\n")
             
             if details.get('patient_info'):
                 patient = details['patient_info']
-                lines.append(f"\nPatient: {patient.get('first_name', '')} {patient.get('last_name', '')}")
+                w(f"\nPatient: {patient.get('first_name', '')} {patient.get('last_name', '')}\n")
                 if patient.get('member_id'):
-                    lines.append(f"Member ID: {patient['member_id']}")
+                    w(f"Member ID: {patient['member_id']}\n")
             
             if details.get('payer_info'):
                 payer = details['payer_info']
-                lines.append(f"\nPayer: {payer.get('name', 'Unknown')}")
+                w(f"\nPayer: {payer.get('name', 'Unknown')}\n")
         
         if result.get('errors'):
-            lines.append("\n⚠️ ERRORS:")
+            w("\n⚠️ ERRORS:\n")
             for error in result['errors']:
-                lines.append(f"  - {error}")
+                w(f"  - {error}\n")
         
         if result.get('files'):
-            lines.append("\n📁 SAVED FILES:")
+            w("\n📁 SAVED FILES:\n")
             for file_type, path in result['files'].items():
-                lines.append(f"  - {file_type}: {path}")
+                w(f"  - {file_type}: {path}\n")
         
-        lines.append("\n" + "="*60)
+        w(f"\n{rule}")
         
-        return '\n'.join(lines)
+        return buf.getvalue()
 
 
 def main():
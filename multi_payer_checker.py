@@ -4,32 +4,65 @@ Supports multiple insurance payers including Utah Medicaid and U of U Health Pla
 """
 
 import os
-import json
+import re
+import copy
+import time
+import asyncio
 import logging
+import threading
+from collections import ChainMap
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, Optional, List
+from typing import Dict, Optional, List, Tuple
 from pathlib import Path
-from dotenv import load_dotenv
+import requests
+from requests.adapters import HTTPAdapter
 
 from x12_builder_multi import X12_270BuilderMulti
 from soap_client import SOAPClient
 from parser import X12_271Parser
 from payer_config import PayerConfig
+from env_bootstrap import ensure_env_loaded
+from file_stamp import now_stamp
 
-# Load environment variables from .env.local
-load_dotenv('.env.local')
+# Load environment variables from .env.local (once per process)
+ensure_env_loaded()
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Configure logging (leave it alone if the host application already has)
+if not logging.getLogger().handlers:
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
 logger = logging.getLogger(__name__)
 
+# Accepted date of birth shapes: YYYY-MM-DD, YYYYMMDD, MM/DD/YYYY
+_DATE_RE = re.compile(
+    r'(\d{4})-(\d{1,2})-(\d{1,2})'
+    r'|(\d{4})(\d{2})(\d{2})'
+    r'|(\d{1,2})/(\d{1,2})/(\d{4})'
+)
+
+# Utah Medicaid plan sponsor keywords (matched against the uppercased text)
+_FFS_KEYWORDS = ('TARGETED ADULT', 'TRADITIONAL')
+_MCO_KEYWORDS = ('MOLINA', 'SELECTHEALTH', 'ANTHEM')
+
 
 class MultiPayerEligibilityChecker:
     """Eligibility checker supporting multiple insurance payers via UHIN"""
 
+    # Connection pool sizing for the shared HTTPS session; maxsize bounds the
+    # sockets kept alive for concurrent check_multiple_payers calls
+    POOL_CONNECTIONS = 4
+    POOL_MAXSIZE = 20
+
+    # In-memory eligibility result cache (successful responses only)
+    RESULT_CACHE_TTL = 12 * 60 * 60  # seconds
+    RESULT_CACHE_MAXSIZE = 10000
+
+    # Concurrent UHIN requests in check_eligibility_batch (kept within POOL_MAXSIZE)
+    BATCH_MAX_WORKERS = 8
+
     def __init__(self, config: Optional[Dict[str, str]] = None):
         """
         Initialize the multi-payer eligibility checker
@@ -52,8 +85,38 @@ class MultiPayerEligibilityChecker:
         self.output_dir = Path("output")
         self.output_dir.mkdir(exist_ok=True)
 
+        # One pooled HTTPS session shared by every per-payer SOAPClient so
+        # keep-alive reuses the TLS connection to UHIN across calls
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.POOL_CONNECTIONS, pool_maxsize=self.POOL_MAXSIZE)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        # Background writer for saved X12 files so disk I/O overlaps the SOAP call
+        self._io_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='x12-save')
+
+        # (payer, patient, test_mode) -> (expires_at, result)
+        self._result_cache = {}
+        self._result_cache_lock = threading.Lock()
+
+        # (receiver_id, payer_name, payer_code) -> (SOAPClient, X12_270BuilderMulti)
+        self._clients = {}
+        self._clients_lock = threading.Lock()
+
         logger.info("Multi-payer eligibility checker initialized")
-        logger.info(f"Available payers: {list(PayerConfig.list_payers().values())}")
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("Available payers: %s", list(PayerConfig.list_payers().values()))
+
+    def close(self):
+        """Close the shared HTTPS session and wait for pending file saves"""
+        self._io_pool.shutdown(wait=True)
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
 
     def _load_config_from_env(self) -> Dict[str, str]:
         """Load configuration from environment variables"""
@@ -73,7 +136,7 @@ class MultiPayerEligibilityChecker:
         missing_fields = [field for field in required_fields if not self.config.get(field)]
 
         if missing_fields:
-            logger.warning(f"Missing required configuration fields: {missing_fields}")
+            logger.warning("Missing required configuration fields: %s", missing_fields)
 
     def check_eligibility(self,
                          payer_key: str,
@@ -83,7 +146,8 @@ class MultiPayerEligibilityChecker:
                          gender: Optional[str] = 'M',
                          member_id: Optional[str] = None,
                          test_mode: bool = False,
-                         save_files: bool = True) -> Dict[str, any]:
+                         save_files: bool = True,
+                         bypass_cache: bool = False) -> Dict[str, any]:
         """
         Check patient eligibility with specified payer
 
@@ -96,130 +160,367 @@ class MultiPayerEligibilityChecker:
             member_id: Optional member ID
             test_mode: If True, uses test environment
             save_files: If True, saves X12 messages to files
+            bypass_cache: If True, always query UHIN (the fresh result still
+                refreshes the cache)
 
         Returns:
             Dictionary containing eligibility response
         """
         try:
-            # Get payer configuration
-            payer = PayerConfig.get_payer(payer_key)
-            if not payer:
-                return {
-                    'success': False,
-                    'error': f'Unknown payer: {payer_key}',
-                    'available_payers': PayerConfig.list_payers()
-                }
+            cache_key = self._result_cache_key(
+                payer_key, first_name, last_name, date_of_birth, gender, member_id, test_mode
+            )
+            if not bypass_cache:
+                cached = self._result_cache_get(cache_key)
+                if cached is not None:
+                    logger.info("Using cached eligibility result for %s", payer_key)
+                    return cached
+
+            request, error_result = self._build_request(
+                payer_key, first_name, last_name, date_of_birth,
+                gender, member_id, test_mode, save_files
+            )
+            if error_result:
+                return error_result
 
-            logger.info(f"Checking eligibility with {payer['name']} (ID: {payer['payer_id']})")
+            try:
+                # Send to UHIN via SOAP
+                logger.info("Sending eligibility request to UHIN for %s", request['payer']['name'])
+                response = request['soap_client'].check_eligibility(request['x12_message'])
 
-            # Check if member ID is required
-            if payer['requires_member_id'] and not member_id:
-                logger.warning(f"{payer['name']} typically requires a member ID - results may be limited")
+                result = self._handle_response(request, response)
+                self._result_cache_put(cache_key, result)
+                return result
+            finally:
+                self._wait_for_saves(request)
 
-            # Get payer-specific configuration
-            receiver_id, payer_name, payer_code = PayerConfig.format_x12_payer_name(
-                payer_key, test_mode
+        except Exception as e:
+            logger.error("Error checking eligibility: %s", e, exc_info=True)
+            return {
+                'success': False,
+                'error': str(e),
+                'payer': payer_key
+            }
+
+    async def check_eligibility_async(self,
+                                      payer_key: str,
+                                      first_name: str,
+                                      last_name: str,
+                                      date_of_birth: str,
+                                      gender: Optional[str] = 'M',
+                                      member_id: Optional[str] = None,
+                                      test_mode: bool = False,
+                                      save_files: bool = True,
+                                      bypass_cache: bool = False) -> Dict[str, any]:
+        """
+        Async variant of check_eligibility
+
+        Only the SOAP round-trip leaves the event loop (it runs in a worker
+        thread); building, saving and parsing are the same synchronous steps.
+        Takes the same arguments and returns the same dictionary as
+        check_eligibility.
+        """
+        try:
+            cache_key = self._result_cache_key(
+                payer_key, first_name, last_name, date_of_birth, gender, member_id, test_mode
+            )
+            if not bypass_cache:
+                cached = self._result_cache_get(cache_key)
+                if cached is not None:
+                    logger.info("Using cached eligibility result for %s", payer_key)
+                    return cached
+
+            request, error_result = self._build_request(
+                payer_key, first_name, last_name, date_of_birth,
+                gender, member_id, test_mode, save_files
             )
+            if error_result:
+                return error_result
 
-            # Update config with payer-specific values
-            payer_config = self.config.copy()
-            payer_config['receiver_id'] = receiver_id
-            payer_config['payer_name'] = payer_name
-            payer_config['payer_code'] = payer_code
+            try:
+                logger.info("Sending eligibility request to UHIN for %s", request['payer']['name'])
+                response = await asyncio.to_thread(
+                    request['soap_client'].check_eligibility, request['x12_message']
+                )
 
-            # Create SOAP client with payer-specific config
-            soap_client = SOAPClient(payer_config)
+                result = self._handle_response(request, response)
+                self._result_cache_put(cache_key, result)
+                return result
+            finally:
+                await self._wait_for_saves_async(request)
 
-            # Build X12 270 message with payer-specific config
-            x12_builder = X12_270BuilderMulti(payer_config)
+        except Exception as e:
+            logger.error("Error checking eligibility: %s", e, exc_info=True)
+            return {
+                'success': False,
+                'error': str(e),
+                'payer': payer_key
+            }
 
-            # Format dates
-            dob = self._format_date(date_of_birth)
-            if not dob:
-                return {
-                    'success': False,
-                    'error': f'Invalid date format: {date_of_birth}. Use YYYY-MM-DD'
-                }
+    def _build_request(self,
+                       payer_key: str,
+                       first_name: str,
+                       last_name: str,
+                       date_of_birth: str,
+                       gender: Optional[str],
+                       member_id: Optional[str],
+                       test_mode: bool,
+                       save_files: bool) -> Tuple[Optional[Dict], Optional[Dict]]:
+        """
+        Resolve the payer, build the X12 270 and save it if requested
 
-            # Build the X12 270 message
-            x12_message = x12_builder.build(
-                patient_first_name=first_name,
-                patient_last_name=last_name,
-                patient_dob=dob.strftime('%Y%m%d'),
-                patient_gender=gender if gender in ['M', 'F'] else 'M',
-                member_id=member_id,
-                eligibility_segments=payer.get('eligibility_segments', ['30'])
-            )
+        Returns:
+            Tuple of (request context, error result) - exactly one is None
+        """
+        # Get payer configuration
+        payer = PayerConfig.get_payer(payer_key)
+        if not payer:
+            return None, {
+                'success': False,
+                'error': f'Unknown payer: {payer_key}',
+                'available_payers': PayerConfig.list_payers()
+            }
 
-            # Save request if requested
-            if save_files:
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                request_file = self.output_dir / f"x12_270_{payer_key}_{last_name}_{timestamp}.txt"
-                request_file.write_text(x12_message)
-                logger.info(f"Saved X12 270 request to: {request_file}")
+        logger.info("Checking eligibility with %s (ID: %s)", payer['name'], payer['payer_id'])
 
-            # Send to UHIN via SOAP
-            logger.info(f"Sending eligibility request to UHIN for {payer['name']}")
-            success, message, x12_response = soap_client.send_request(x12_message)
+        # Check if member ID is required
+        if payer['requires_member_id'] and not member_id:
+            logger.warning("%s typically requires a member ID - results may be limited", payer['name'])
 
-            logger.debug(f"SOAP Response - Success: {success}, Message: {message}, Has X12: {bool(x12_response)}")
+        # SOAP client and X12 builder with payer-specific config
+        soap_client, x12_builder = self._payer_clients(payer_key, test_mode)
 
-            # Check if request was successful
-            if not success:
-                return {
-                    'success': False,
-                    'error': message,
-                    'payer': payer['name']
-                }
+        # Format dates
+        dob = self._format_date(date_of_birth)
+        if not dob:
+            return None, {
+                'success': False,
+                'error': f'Invalid date format: {date_of_birth}. Use YYYY-MM-DD'
+            }
 
-            # Save response if requested
-            if save_files and x12_response:
-                response_file = self.output_dir / f"x12_271_{payer_key}_{last_name}_{timestamp}.txt"
-                response_file.write_text(x12_response)
-                logger.info(f"Saved X12 271 response to: {response_file}")
+        # Build the X12 270 message
+        x12_message = x12_builder.build(
+            patient_first_name=first_name,
+            patient_last_name=last_name,
+            patient_dob=dob.strftime('%Y%m%d'),
+            patient_gender=gender if gender in ['M', 'F'] else 'M',
+            member_id=member_id,
+            eligibility_segments=payer.get('eligibility_segments', ['30'])
+        )
+
+        # Save request if requested (in the background, overlapping the SOAP call)
+        timestamp = None
+        pending_saves = []
+        if save_files:
+            # now_stamp adds a counter within a second, so concurrent batch
+            # checks never share a file name
+            timestamp = now_stamp()
+            request_file = self.output_dir / f"x12_270_{payer_key}_{last_name}_{first_name}_{timestamp}.txt"
+            pending_saves.append(self._io_pool.submit(self._save_file, request_file, x12_message, '270 request'))
 
-            # Parse the X12 271 response
-            if x12_response:
-                result = self.x12_parser.parse(x12_response)
-                result['payer'] = payer['name']
-                result['payer_id'] = payer['payer_id']
+        return {
+            'payer_key': payer_key,
+            'payer': payer,
+            'soap_client': soap_client,
+            'x12_message': x12_message,
+            'last_name': last_name,
+            'first_name': first_name,
+            'save_files': save_files,
+            'timestamp': timestamp,
+            'pending_saves': pending_saves
+        }, None
+
+    def _payer_clients(self, payer_key: str, test_mode: bool) -> Tuple[SOAPClient, X12_270BuilderMulti]:
+        """
+        Get the (cached) SOAP client and X12 270 builder for a payer
 
-                # Add payer-specific interpretation
-                result['interpretation'] = self._interpret_eligibility(result, payer_key)
+        Clients are keyed on the resolved (receiver_id, payer_name, payer_code),
+        so a payer re-registered with new values gets fresh instances.
 
-                return result
-            else:
-                return {
-                    'success': False,
-                    'error': 'No response received from UHIN',
-                    'payer': payer['name']
-                }
+        Args:
+            payer_key: Payer identifier
+            test_mode: Whether to use the payer's test receiver ID
 
-        except Exception as e:
-            logger.error(f"Error checking eligibility: {str(e)}", exc_info=True)
+        Returns:
+            Tuple of (SOAPClient, X12_270BuilderMulti) sharing one payer config
+        """
+        # Get payer-specific configuration
+        payer_fields = PayerConfig.format_x12_payer_name(payer_key, test_mode)
+
+        with self._clients_lock:
+            clients = self._clients.get(payer_fields)
+            if clients is None:
+                clients = self._create_payer_clients(*payer_fields)
+                self._clients[payer_fields] = clients
+        return clients
+
+    def _create_payer_clients(self,
+                              receiver_id: str,
+                              payer_name: str,
+                              payer_code: str) -> Tuple[SOAPClient, X12_270BuilderMulti]:
+        """Create a SOAP client and X12 270 builder for one payer configuration"""
+        # Overlay payer-specific values on the shared config (no full copy;
+        # SOAPClient and X12_270BuilderMulti only read from it)
+        payer_config = ChainMap({
+            'receiver_id': receiver_id,
+            'payer_name': payer_name,
+            'payer_code': payer_code
+        }, self.config)
+
+        return SOAPClient(payer_config, session=self.session), X12_270BuilderMulti(payer_config)
+
+    def _handle_response(self, request: Dict, response: Dict) -> Dict[str, any]:
+        """
+        Save and parse the UHIN response for a request built by _build_request
+
+        Args:
+            request: Request context from _build_request
+            response: Result of SOAPClient.check_eligibility (success, x12_271, error,
+                soap_fault, raw_response)
+        """
+        payer_key = request['payer_key']
+        payer = request['payer']
+        x12_response = response.get('x12_271')
+
+        logger.debug("SOAP Response - Success: %s, Error: %s, Has X12: %s",
+                     response['success'], response.get('error'), bool(x12_response))
+
+        # Check if request was successful; keep the fault details for diagnosis
+        if not response['success']:
             return {
                 'success': False,
-                'error': str(e),
-                'payer': payer_key
+                'error': response.get('error') or 'No response received from UHIN',
+                'soap_fault': response.get('soap_fault'),
+                'raw_response': response.get('raw_response'),
+                'payer': payer['name']
             }
 
+        # Save response if requested
+        if request['save_files'] and x12_response:
+            response_file = self.output_dir / (
+                f"x12_271_{payer_key}_{request['last_name']}_{request['first_name']}_{request['timestamp']}.txt"
+            )
+            request['pending_saves'].append(
+                self._io_pool.submit(self._save_file, response_file, x12_response, '271 response')
+            )
+
+        # Parse the X12 271 response
+        if x12_response:
+            result = self.x12_parser.parse(x12_response)
+            result['payer'] = payer['name']
+            result['payer_id'] = payer['payer_id']
+
+            # Add payer-specific interpretation
+            result['interpretation'] = self._interpret_eligibility(result, payer_key, payer)
+
+            return result
+        else:
+            return {
+                'success': False,
+                'error': 'No response received from UHIN',
+                'payer': payer['name']
+            }
+
+    def _result_cache_key(self,
+                          payer_key: str,
+                          first_name: str,
+                          last_name: str,
+                          date_of_birth: str,
+                          gender: Optional[str],
+                          member_id: Optional[str],
+                          test_mode: bool) -> Tuple:
+        """
+        Build the result cache key for one patient/payer inquiry
+
+        Keyed on the values the 270 is built from (the builder upper-cases names
+        without stripping them and sends any gender but F as M), so two inquiries
+        share an entry only if they send the same message.
+        """
+        return (str(payer_key).upper(), str(first_name).upper(), str(last_name).upper(),
+                str(date_of_birth), gender if gender == 'F' else 'M', member_id, test_mode)
+
+    def _result_cache_get(self, key: Tuple) -> Optional[Dict]:
+        """Return a copy of a cached result, or None if missing or expired"""
+        with self._result_cache_lock:
+            entry = self._result_cache.get(key)
+            if entry is None:
+                return None
+            expires_at, result = entry
+            if expires_at <= time.monotonic():
+                del self._result_cache[key]
+                return None
+            return copy.deepcopy(result)
+
+    def _result_cache_put(self, key: Tuple, result: Dict):
+        """Cache a successful result (failures are never cached)"""
+        if not result.get('success'):
+            return
+
+        now = time.monotonic()
+        with self._result_cache_lock:
+            self._result_cache.pop(key, None)
+            if len(self._result_cache) >= self.RESULT_CACHE_MAXSIZE:
+                # Drop expired entries first, then the oldest insertions
+                for stale in [k for k, (expires_at, _) in self._result_cache.items() if expires_at <= now]:
+                    del self._result_cache[stale]
+                while len(self._result_cache) >= self.RESULT_CACHE_MAXSIZE:
+                    del self._result_cache[next(iter(self._result_cache))]
+            self._result_cache[key] = (now + self.RESULT_CACHE_TTL, copy.deepcopy(result))
+
+    def clear_result_cache(self):
+        """Forget all cached eligibility results"""
+        with self._result_cache_lock:
+            self._result_cache.clear()
+
+    def _save_file(self, path: Path, content: str, label: str):
+        """Write an X12 message to disk (runs on the background I/O pool)"""
+        # Binary write: no newline translation or locale encoding layer
+        path.write_bytes(content.encode('utf-8'))
+        logger.info("Saved X12 %s to: %s", label, path)
+
+    def _wait_for_saves(self, request: Dict):
+        """Block until a request's background saves finish, logging any failures"""
+        for future in request['pending_saves']:
+            error = future.exception()
+            if error:
+                logger.error("Error saving X12 file: %s", error)
+
+    async def _wait_for_saves_async(self, request: Dict):
+        """Await a request's background saves without blocking the event loop"""
+        for future in request['pending_saves']:
+            try:
+                await asyncio.wrap_future(future)
+            except Exception as e:
+                logger.error("Error saving X12 file: %s", e)
+
     def _format_date(self, date_str: str) -> Optional[datetime]:
         """Convert date string to datetime object"""
-        date_formats = ['%Y-%m-%d', '%Y%m%d', '%m/%d/%Y']
-        for fmt in date_formats:
-            try:
-                return datetime.strptime(date_str, fmt)
-            except ValueError:
-                continue
-        return None
+        # Classify the shape first so malformed input never reaches a parser
+        match = _DATE_RE.fullmatch(date_str)
+        if not match:
+            return None
+
+        ymd = match.group(1, 2, 3)
+        if ymd[0] is None:
+            ymd = match.group(4, 5, 6)
+        if ymd[0] is None:
+            month, day, year = match.group(7, 8, 9)
+            ymd = (year, month, day)
 
-    def _interpret_eligibility(self, result: Dict, payer_key: str) -> Dict:
+        try:
+            return datetime(*map(int, ymd))
+        except ValueError:
+            # Right shape, impossible date (e.g. month 13)
+            return None
+
+    def _interpret_eligibility(self, result: Dict, payer_key: str, payer: Dict) -> Dict:
         """
         Interpret eligibility response based on payer
 
         Args:
             result: Parsed X12 271 response
             payer_key: Payer identifier
+            payer: Payer configuration (as returned by PayerConfig.get_payer)
 
         Returns:
             Interpretation dictionary
@@ -238,11 +539,11 @@ class MultiPayerEligibilityChecker:
 
             if payer_key == 'UTAH_MEDICAID':
                 # Check for FFS vs managed care
-                plan_info = patient_info.get('plan_sponsor', '')
-                if 'TARGETED ADULT' in plan_info.upper() or 'TRADITIONAL' in plan_info.upper():
+                plan_info = patient_info.get('plan_sponsor', '').upper()
+                if any(keyword in plan_info for keyword in _FFS_KEYWORDS):
                     interpretation['coverage_type'] = 'Traditional FFS Medicaid'
                     interpretation['notes'].append('Qualifies for contingency management program')
-                elif any(mco in plan_info.upper() for mco in ['MOLINA', 'SELECTHEALTH', 'ANTHEM']):
+                elif any(mco in plan_info for mco in _MCO_KEYWORDS):
                     interpretation['coverage_type'] = 'Managed Care Medicaid'
                     interpretation['notes'].append('Does NOT qualify for CM program - managed care')
                 else:
@@ -261,7 +562,7 @@ class MultiPayerEligibilityChecker:
                         interpretation['notes'].append(f"Covered services: {', '.join(covered_services)}")
 
             else:
-                interpretation['coverage_type'] = f'{PayerConfig.get_payer(payer_key)["name"]} Coverage'
+                interpretation['coverage_type'] = f'{payer["name"]} Coverage'
 
         return interpretation
 
@@ -271,10 +572,15 @@ class MultiPayerEligibilityChecker:
                             date_of_birth: str,
                             payers: Optional[List[str]] = None,
                             gender: Optional[str] = 'M',
-                            member_id: Optional[str] = None) -> Dict[str, Dict]:
+                            member_id: Optional[str] = None,
+                            bypass_cache: bool = False) -> Dict[str, Dict]:
         """
         Check eligibility with multiple payers
 
+        Payers are queried concurrently (see check_multiple_payers_async), so
+        total wall time is roughly the slowest single round-trip. Must not be
+        called from inside a running event loop - await the async variant there.
+
         Args:
             first_name: Patient's first name
             last_name: Patient's last name
@@ -282,39 +588,142 @@ class MultiPayerEligibilityChecker:
             payers: List of payer keys to check (default: all)
             gender: Patient's gender
             member_id: Optional member ID
+            bypass_cache: If True, skip cached results and query every payer
 
         Returns:
             Dictionary of payer results
         """
+        return asyncio.run(self.check_multiple_payers_async(
+            first_name=first_name,
+            last_name=last_name,
+            date_of_birth=date_of_birth,
+            payers=payers,
+            gender=gender,
+            member_id=member_id,
+            bypass_cache=bypass_cache
+        ))
+
+    async def check_multiple_payers_async(self,
+                                          first_name: str,
+                                          last_name: str,
+                                          date_of_birth: str,
+                                          payers: Optional[List[str]] = None,
+                                          gender: Optional[str] = 'M',
+                                          member_id: Optional[str] = None,
+                                          bypass_cache: bool = False) -> Dict[str, Dict]:
+        """
+        Check eligibility with multiple payers concurrently
+
+        Takes the same arguments and returns the same dictionary as
+        check_multiple_payers.
+        """
         if not payers:
             payers = list(PayerConfig.list_payers().keys())
 
-        results = {}
+        tasks = []
         for payer_key in payers:
-            logger.info(f"Checking eligibility with {payer_key}")
-            result = self.check_eligibility(
+            logger.info("Checking eligibility with %s", payer_key)
+            tasks.append(asyncio.create_task(self.check_eligibility_async(
                 payer_key=payer_key,
                 first_name=first_name,
                 last_name=last_name,
                 date_of_birth=date_of_birth,
                 gender=gender,
                 member_id=member_id,
-                save_files=True
-            )
+                save_files=True,
+                bypass_cache=bypass_cache
+            )))
+
+        outcomes = await asyncio.gather(*tasks, return_exceptions=True)
+
+        results = {}
+        for payer_key, result in zip(payers, outcomes):
+            if isinstance(result, Exception):
+                logger.error("Error checking eligibility with %s: %s", payer_key, result)
+                result = {
+                    'success': False,
+                    'error': str(result),
+                    'payer': payer_key
+                }
             results[payer_key] = result
 
             # Add summary
             if result.get('success'):
                 interp = result.get('interpretation', {})
-                logger.info(f"{payer_key}: {interp.get('coverage_type', 'Unknown')} - "
-                          f"Eligible: {interp.get('is_eligible', False)}")
+                logger.info("%s: %s - Eligible: %s", payer_key,
+                            interp.get('coverage_type', 'Unknown'), interp.get('is_eligible', False))
 
         return results
 
 
+    def check_eligibility_batch(self,
+                                patients: List[Dict],
+                                payer_key: str,
+                                test_mode: bool = False,
+                                save_files: bool = True,
+                                bypass_cache: bool = False,
+                                max_workers: Optional[int] = None) -> List[Dict]:
+        """
+        Check eligibility for many patients with one payer
+
+        Each patient gets its own real-time 270 (CORE real-time allows one
+        subscriber per inquiry); the checks run concurrently, since each is
+        mostly waiting on UHIN, and cached patients are answered without a call.
+
+        Args:
+            patients: List of patient dictionaries with first_name, last_name,
+                date_of_birth and optional gender and member_id
+            payer_key: Payer identifier
+            test_mode: If True, uses test environment
+            save_files: If True, saves X12 messages to files
+            bypass_cache: If True, ignore cached results and query every patient
+            max_workers: Concurrent requests (defaults to BATCH_MAX_WORKERS;
+                1 checks patients one at a time)
+
+        Returns:
+            List of {'patient': ..., 'result': ...} dictionaries, in input order
+        """
+        payer = PayerConfig.get_payer(payer_key)
+        if not payer:
+            error = {
+                'success': False,
+                'error': f'Unknown payer: {payer_key}',
+                'available_payers': PayerConfig.list_payers()
+            }
+            return [{'patient': patient, 'result': dict(error)} for patient in patients]
+
+        def check(patient: Dict) -> Dict:
+            return self.check_eligibility(
+                payer_key=payer_key,
+                first_name=patient.get('first_name', ''),
+                last_name=patient.get('last_name', ''),
+                date_of_birth=patient.get('date_of_birth') or '',
+                gender=patient.get('gender', 'M'),
+                member_id=patient.get('member_id'),
+                test_mode=test_mode,
+                save_files=save_files,
+                bypass_cache=bypass_cache
+            )
+
+        logger.info("Checking %d patients with %s", len(patients), payer['name'])
+        workers = min(max_workers or self.BATCH_MAX_WORKERS, len(patients))
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='uhin-batch') as pool:
+                results = list(pool.map(check, patients))
+        else:
+            results = [check(patient) for patient in patients]
+
+        return [{'patient': patient, 'result': result} for patient, result in zip(patients, results)]
+
+
 def main():
     """Test multi-payer eligibility checking"""
-    checker = MultiPayerEligibilityChecker()
+    with MultiPayerEligibilityChecker() as checker:
+        _run_checks(checker)
+
+
+def _run_checks(checker: 'MultiPayerEligibilityChecker'):
+    """Run the Utah Medicaid and U of U Health checks from main()"""
 
     # Test with Jeremy Montoya
     print("\n" + "="*60)
@@ -364,4 +773,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
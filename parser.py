@@ -4,10 +4,13 @@ Parses X12 271 eligibility responses and determines FFS vs Managed Care status
 """
 
 from typing import Dict, List, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from itertools import repeat
+import io
 import logging
+import re
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
@@ -51,6 +54,9 @@ class X12_271Parser:
         'Y': 'Spend Down'
     }
     
+    # EB01 codes that mean active coverage (every ELIGIBILITY_CODES "Active..." entry)
+    ACTIVE_CODES = frozenset({'1', '2', '3', '4', '5'})
+    
     # AAA Error codes
     AAA_ERROR_CODES = {
         '15': 'Required application data missing',
@@ -91,28 +97,79 @@ class X12_271Parser:
         '76': 'Duplicate Patient ID/Name'
     }
     
+    # DTP date/time qualifiers (DTP01)
+    DATE_TYPES = {
+        '291': 'Plan Begin',
+        '292': 'Plan End',
+        '346': 'Plan Period',
+        '347': 'Benefit Begin',
+        '348': 'Benefit End',
+        '349': 'Benefit Period',
+        '356': 'Eligibility Begin',
+        '357': 'Eligibility End'
+    }
+    
+    # REF reference identification qualifiers (REF01)
+    REF_TYPES = {
+        '1L': 'Group Number',
+        '18': 'Plan Number',
+        '49': 'Family Unit Number',
+        '6P': 'Group ID',
+        'HJ': 'Identity Card Number',
+        'IG': 'Insurance Policy Number',
+        'N6': 'Plan Network ID',
+        'SY': 'Social Security Number',
+        'ZZ': 'Mutually Defined'
+    }
+    
+    # NM1*PR names that are transportation vendors, not the primary payer
+    TRANSPORTATION_VENDORS = ('MODIVCARE', 'LOGISTICARE', 'VEYO', 'TRANSPORTATION')
+    
+    # EB plan description patterns (matched against the uppercased text)
+    TAM_PLAN_PATTERN = re.compile(r'TRADITIONAL ADULT|TARGETED ADULT')
+    MANAGED_CARE_PLAN_PATTERN = re.compile(r'MOLINA|SELECTHEALTH|ANTHEM|HEALTHY U')
+    
+    # NM1*PR payer name keywords (matched against the uppercased name)
+    PAYER_NAME_PATTERN = re.compile(r'MEDICAID|UTAH|TARGETED ADULT|TRADITIONAL')
+    
     def __init__(self):
-        self.segments = []
         self.parsed_data = {}
         
-    def parse(self, x12_271: str) -> Dict[str, any]:
+        # Segment ID -> handler dispatch table used by parse()
+        self._segment_handlers = {
+            'ISA': self._parse_isa,
+            'ST': self._parse_st,
+            'BHT': self._parse_bht,
+            'NM1': self._parse_nm1,
+            'EB': self._parse_eb,
+            'AAA': self._parse_aaa,
+            'DTP': self._parse_dtp,
+            'REF': self._parse_ref,
+            'MSG': self._parse_msg
+        }
+        
+        # NM1 entity identifier (NM101) -> handler, used by _parse_nm1
+        self._nm1_handlers = {
+            'PR': self._parse_nm1_payer,       # Payer
+            'IL': self._parse_nm1_subscriber,  # Insured/Subscriber
+            '1P': self._parse_nm1_provider     # Provider
+        }
+        
+    def parse(self, x12_271: str, keep_raw: bool = False) -> Dict[str, any]:
         """
         Parse X12 271 response message
         
         Args:
             x12_271: Raw X12 271 response string
+            keep_raw: If True, also return the raw NM1/EB/AAA/DTP/REF segments
+                under 'raw_segments' (for debugging)
             
         Returns:
             Dictionary containing parsed eligibility information
         """
         # Clean and split the message into segments
         x12_271 = x12_271.strip()
-        
-        # Handle both ~ and newline as segment terminators
-        if '~' in x12_271:
-            self.segments = [seg.strip() for seg in x12_271.split('~') if seg.strip()]
-        else:
-            self.segments = [seg.strip() for seg in x12_271.split('\n') if seg.strip()]
+        element_sep, terminator = self._detect_separators(x12_271)
         
         # Initialize result structure
         result = {
@@ -127,47 +184,48 @@ class X12_271Parser:
             'plan_info': {},
             'ffs_status': 'UNKNOWN',
             'managed_care_detected': False,
-            'raw_segments': {
+            # Coverage facts gathered by _parse_eb for _determine_ffs_status; popped below
+            '_flags': {'has_active': False, 'has_traditional_adult': False}
+        }
+        
+        # Raw segment retention is opt-in; an empty dict makes the lookup below a no-op
+        raw_segments = {}
+        if keep_raw:
+            raw_segments = result['raw_segments'] = {
                 'EB': [],
                 'AAA': [],
                 'NM1': [],
                 'DTP': [],
                 'REF': []
             }
-        }
         
-        # Process each segment
-        for segment in self.segments:
+        # Process each segment in a single pass (stripped once, blanks skipped)
+        for segment in x12_271.split(terminator):
+            segment = segment.strip()
             if not segment:
                 continue
                 
+            # Split into elements once; handlers work on the parts list
+            parts = segment.split(element_sep)
+            
             # Get segment ID (first 2-3 chars before * or ~)
-            if '*' in segment:
-                segment_id = segment.split('*')[0]
+            if len(parts) > 1:
+                segment_id = parts[0]
             else:
                 segment_id = segment[:3] if len(segment) >= 3 else ''
             
-            if segment_id == 'ISA':
-                self._parse_isa(segment, result)
-            elif segment_id == 'ST':
-                self._parse_st(segment, result)
-            elif segment_id == 'BHT':
-                self._parse_bht(segment, result)
-            elif segment_id == 'NM1':
-                self._parse_nm1(segment, result)
-            elif segment_id == 'EB':
-                self._parse_eb(segment, result)
-            elif segment_id == 'AAA':
-                self._parse_aaa(segment, result)
-            elif segment_id == 'DTP':
-                self._parse_dtp(segment, result)
-            elif segment_id == 'REF':
-                self._parse_ref(segment, result)
-            elif segment_id == 'MSG':
-                self._parse_msg(segment, result)
+            if raw_segments:
+                raw = raw_segments.get(segment_id)
+                if raw is not None:
+                    raw.append(segment)
+            
+            handler = self._segment_handlers.get(segment_id)
+            if handler:
+                handler(parts, result)
         
         # Determine FFS status based on parsed data
         self._determine_ffs_status(result)
+        del result['_flags']
         
         # Set overall success flag
         if result['eligibility_details'] and not result['errors']:
@@ -179,9 +237,53 @@ class X12_271Parser:
         
         return result
     
-    def _parse_isa(self, segment: str, result: Dict):
+    def parse_many(self, responses: List[str], keep_raw: bool = False,
+                   max_workers: Optional[int] = None) -> List[Dict]:
+        """
+        Parse a corpus of X12 271 responses (e.g. a nightly re-check run)
+        
+        Args:
+            responses: Raw X12 271 response strings
+            keep_raw: Passed through to parse() for each response
+            max_workers: If set, parse across this many worker processes;
+                otherwise parse sequentially in this process
+            
+        Returns:
+            Parsed results in the same order as responses
+        """
+        if not max_workers or len(responses) < 2:
+            return [self.parse(x12_271, keep_raw) for x12_271 in responses]
+        
+        # Parsing is CPU-bound Python, so spread it over processes rather than threads
+        chunksize = max(1, len(responses) // (max_workers * 4))
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            return list(pool.map(_parse_in_worker, responses, repeat(keep_raw),
+                                 chunksize=chunksize))
+    
+    def _detect_separators(self, x12_271: str) -> Tuple[str, str]:
+        """
+        Get the element separator and segment terminator for a message
+        
+        A fixed-width ISA declares both (position 3 and position 105);
+        otherwise fall back to '*' with ~ or newline as the terminator.
+        
+        Returns:
+            Tuple of (element_separator, segment_terminator)
+        """
+        if x12_271.startswith('ISA') and len(x12_271) > 105:
+            element_sep = x12_271[3]
+            # A well-formed ISA has exactly 16 element separators before the terminator
+            if x12_271.count(element_sep, 0, 105) == 16 and x12_271[104] != element_sep:
+                terminator = x12_271[105]
+                if terminator in '\r\n':
+                    terminator = '\n'
+                return element_sep, terminator
+        
+        # Handle both ~ and newline as segment terminators
+        return '*', '~' if '~' in x12_271 else '\n'
+    
+    def _parse_isa(self, parts: List[str], result: Dict):
         """Parse ISA segment for interchange information"""
-        parts = segment.split('*')
         if len(parts) >= 17:
             result['interchange_info'] = {
                 'sender_id': parts[6].strip(),
@@ -191,89 +293,82 @@ class X12_271Parser:
                 'control_number': parts[13]
             }
     
-    def _parse_st(self, segment: str, result: Dict):
+    def _parse_st(self, parts: List[str], result: Dict):
         """Parse ST segment for transaction set information"""
-        parts = segment.split('*')
         if len(parts) >= 3:
             result['transaction_info'] = {
                 'type': parts[1],
                 'control_number': parts[2]
             }
     
-    def _parse_bht(self, segment: str, result: Dict):
+    def _parse_bht(self, parts: List[str], result: Dict):
         """Parse BHT segment for beginning of hierarchical transaction"""
-        parts = segment.split('*')
         if len(parts) >= 5:
-            result['transaction_info'] = result.get('transaction_info', {})
-            result['transaction_info'].update({
-                'purpose': parts[1],
-                'reference': parts[2] if len(parts) > 2 else '',
-                'date': parts[3] if len(parts) > 3 else '',
-                'time': parts[4] if len(parts) > 4 else ''
-            })
+            # Merge into the ST entry (if any) rather than replacing it
+            transaction_info = result.setdefault('transaction_info', {})
+            transaction_info['purpose'] = parts[1]
+            transaction_info['reference'] = parts[2]
+            transaction_info['date'] = parts[3]
+            transaction_info['time'] = parts[4]
     
-    def _parse_nm1(self, segment: str, result: Dict):
+    def _parse_nm1(self, parts: List[str], result: Dict):
         """Parse NM1 segment for name information"""
-        parts = segment.split('*')
-        result['raw_segments']['NM1'].append(segment)
-
         if len(parts) < 3:
             return
 
-        entity_type = parts[1]
+        handler = self._nm1_handlers.get(parts[1])
+        if handler:
+            handler(parts, result)
 
-        # PR = Payer
-        if entity_type == 'PR':
-            payer_name = parts[3] if len(parts) > 3 else ''
+    def _parse_nm1_payer(self, parts: List[str], result: Dict):
+        """Parse NM1*PR (payer) name"""
+        payer_name = parts[3] if len(parts) > 3 else ''
 
-            # Skip transportation vendors - they're not the primary payer
-            if any(transport in payer_name.upper() for transport in ['MODIVCARE', 'LOGISTICARE', 'VEYO', 'TRANSPORTATION']):
-                # Store as transportation vendor but don't treat as primary payer
-                result['transportation_vendor'] = payer_name
-                return
+        # Skip transportation vendors - they're not the primary payer
+        payer_name_upper = payer_name.upper()
+        if any(transport in payer_name_upper for transport in self.TRANSPORTATION_VENDORS):
+            # Store as transportation vendor but don't treat as primary payer
+            result['transportation_vendor'] = payer_name
+            return
 
-            # This is the primary payer
-            result['payer_info'] = {
-                'name': payer_name,
-                'id_qualifier': parts[8] if len(parts) > 8 else '',
-                'id': parts[9].rstrip('~') if len(parts) > 9 else ''
-            }
+        # This is the primary payer
+        payer_info = result['payer_info'] = {
+            'name': payer_name,
+            'id_qualifier': parts[8] if len(parts) > 8 else '',
+            'id': parts[9] if len(parts) > 9 else ''
+        }
 
-            # Check for Utah Medicaid
-            payer_name_upper = payer_name.upper()
-            if 'MEDICAID' in payer_name_upper or 'UTAH' in payer_name_upper:
-                result['payer_info']['is_utah_medicaid'] = True
+        # Check for Utah Medicaid and specific programs in one scan of the name
+        keywords = set(self.PAYER_NAME_PATTERN.findall(payer_name_upper))
+        if 'MEDICAID' in keywords or 'UTAH' in keywords:
+            payer_info['is_utah_medicaid'] = True
 
-                # Check for specific programs
-                if 'TARGETED ADULT' in payer_name_upper:
-                    result['plan_info']['program'] = 'Targeted Adult Medicaid'
-                elif 'TRADITIONAL' in payer_name_upper:
-                    result['plan_info']['program'] = 'Traditional Medicaid'
-        
-        # IL = Insured/Subscriber
-        elif entity_type == 'IL':
-            result['patient_info'] = {
-                'last_name': parts[3] if len(parts) > 3 else '',
-                'first_name': parts[4] if len(parts) > 4 else '',
-                'middle_name': parts[5] if len(parts) > 5 else '',
-                'id_qualifier': parts[8] if len(parts) > 8 else '',
-                'member_id': parts[9].rstrip('~') if len(parts) > 9 else ''
-            }
-        
-        # 1P = Provider
-        elif entity_type == '1P':
-            result['provider_info'] = {
-                'last_name': parts[3] if len(parts) > 3 else '',
-                'first_name': parts[4] if len(parts) > 4 else '',
-                'id_qualifier': parts[8] if len(parts) > 8 else '',
-                'npi': parts[9].rstrip('~') if len(parts) > 9 else ''
-            }
+            if 'TARGETED ADULT' in keywords:
+                result['plan_info']['program'] = 'Targeted Adult Medicaid'
+            elif 'TRADITIONAL' in keywords:
+                result['plan_info']['program'] = 'Traditional Medicaid'
+
+    def _parse_nm1_subscriber(self, parts: List[str], result: Dict):
+        """Parse NM1*IL (insured/subscriber) name"""
+        result['patient_info'] = {
+            'last_name': parts[3] if len(parts) > 3 else '',
+            'first_name': parts[4] if len(parts) > 4 else '',
+            'middle_name': parts[5] if len(parts) > 5 else '',
+            'id_qualifier': parts[8] if len(parts) > 8 else '',
+            'member_id': parts[9] if len(parts) > 9 else ''
+        }
+
+    def _parse_nm1_provider(self, parts: List[str], result: Dict):
+        """Parse NM1*1P (provider) name"""
+        result['provider_info'] = {
+            'last_name': parts[3] if len(parts) > 3 else '',
+            'first_name': parts[4] if len(parts) > 4 else '',
+            'id_qualifier': parts[8] if len(parts) > 8 else '',
+            'npi': parts[9] if len(parts) > 9 else ''
+        }
     
-    def _parse_eb(self, segment: str, result: Dict):
+    def _parse_eb(self, parts: List[str], result: Dict):
         """Parse EB segment for eligibility/benefit information"""
-        parts = segment.split('*')
-        result['raw_segments']['EB'].append(segment)
-        
         if len(parts) < 2:
             return
         
@@ -283,58 +378,72 @@ class X12_271Parser:
         insurance_type = parts[4] if len(parts) > 4 else ''
         plan_description = parts[5] if len(parts) > 5 else ''
         
+        # Only format the Unknown label on a miss; .get() would build it for every segment
+        try:
+            status = self.ELIGIBILITY_CODES[eligibility_code]
+        except KeyError:
+            status = f'Unknown ({eligibility_code})'
+        
         detail = {
             'code': eligibility_code,
-            'status': self.ELIGIBILITY_CODES.get(eligibility_code, f'Unknown ({eligibility_code})'),
+            'status': status,
             'coverage_level': coverage_level,
             'service_types': service_types,
             'insurance_type': insurance_type,
-            'plan_description': plan_description.rstrip('~')
+            'plan_description': plan_description
         }
         
         result['eligibility_details'].append(detail)
         
+        plan_upper = plan_description.upper()
+        is_transportation = 'TRANSPORTATION' in plan_upper
+        
+        # Record active coverage (ignoring transportation) and TAM while the EB is in hand
+        flags = result['_flags']
+        if eligibility_code in self.ACTIVE_CODES and not is_transportation:
+            flags['has_active'] = True
+        if 'TRADITIONAL ADULT' in plan_upper:
+            flags['has_traditional_adult'] = True
+        
         # Check for managed care indicators
         if insurance_type:
+            plan_info = result['plan_info']
+            insurance_type_upper = insurance_type.upper()
             # HM = Health Maintenance Organization (HMO) - but check if it's just transportation
-            if 'HM' in insurance_type.upper():
+            if 'HM' in insurance_type_upper:
                 # Check if this is just transportation, not primary insurance
-                if 'TRANSPORTATION' not in plan_description.upper():
+                if not is_transportation:
                     result['managed_care_detected'] = True
-                    result['plan_info']['type'] = 'HMO'
+                    plan_info['type'] = 'HMO'
             # MC = Medicaid
-            elif 'MC' in insurance_type.upper():
-                result['plan_info']['type'] = 'Medicaid'
+            elif 'MC' in insurance_type_upper:
+                plan_info['type'] = 'Medicaid'
 
                 # Check plan description for FFS indicators
                 if plan_description:
-                    plan_upper = plan_description.upper()
                     # CRITICAL: ONLY "TRADITIONAL ADULT" or "TARGETED ADULT" qualify for CM
                     # "TRADITIONAL ADULT" is how Utah labels TAM in their system
-                    if 'TRADITIONAL ADULT' in plan_upper or 'TARGETED ADULT' in plan_upper:
-                        result['plan_info']['program'] = 'Targeted Adult Medicaid (TAM)'
+                    if self.TAM_PLAN_PATTERN.search(plan_upper):
+                        plan_info['program'] = 'Targeted Adult Medicaid (TAM)'
                         result['ffs_status'] = 'TAM_FFS'  # Specifically TAM, not just any FFS
                         # Override any managed care detection - TAM is always FFS
                         result['managed_care_detected'] = False
                     # Traditional Medicaid WITHOUT "ADULT" - DO NOT QUALIFY
                     # This could be temporary pre-ACO assignment
                     elif 'TRADITIONAL' in plan_upper and 'ADULT' not in plan_upper:
-                        result['plan_info']['program'] = 'Traditional Medicaid (Non-TAM)'
+                        plan_info['program'] = 'Traditional Medicaid (Non-TAM)'
                         result['ffs_status'] = 'TRADITIONAL_NON_TAM'  # Not qualified for CM
-                    elif any(mc in plan_upper for mc in ['MOLINA', 'SELECTHEALTH', 'ANTHEM', 'HEALTHY U']):
+                    elif self.MANAGED_CARE_PLAN_PATTERN.search(plan_upper):
                         result['managed_care_detected'] = True
                         result['ffs_status'] = 'MANAGED_CARE'
     
-    def _parse_aaa(self, segment: str, result: Dict):
+    def _parse_aaa(self, parts: List[str], result: Dict):
         """Parse AAA segment for request validation errors"""
-        parts = segment.split('*')
-        result['raw_segments']['AAA'].append(segment)
-        
         if len(parts) < 5:
             return
         
         error_code = parts[3] if len(parts) > 3 else ''
-        error_desc = parts[4].rstrip('~') if len(parts) > 4 else ''
+        error_desc = parts[4] if len(parts) > 4 else ''
         
         error_info = {
             'code': error_code,
@@ -343,92 +452,54 @@ class X12_271Parser:
         
         result['errors'].append(error_info)
     
-    def _parse_dtp(self, segment: str, result: Dict):
+    def _parse_dtp(self, parts: List[str], result: Dict):
         """Parse DTP segment for date/time period information"""
-        parts = segment.split('*')
-        result['raw_segments']['DTP'].append(segment)
-        
         if len(parts) < 4:
             return
         
         date_qualifier = parts[1]
         date_format = parts[2]
-        date_value = parts[3].rstrip('~')
-        
-        # Common date qualifiers
-        date_types = {
-            '291': 'Plan Begin',
-            '292': 'Plan End',
-            '346': 'Plan Period',
-            '347': 'Benefit Begin',
-            '348': 'Benefit End',
-            '349': 'Benefit Period',
-            '356': 'Eligibility Begin',
-            '357': 'Eligibility End'
-        }
+        date_value = parts[3]
         
-        if date_qualifier in date_types:
-            result['plan_info'][date_types[date_qualifier]] = date_value
+        field = self.DATE_TYPES.get(date_qualifier)
+        if field:
+            result['plan_info'][field] = date_value
     
-    def _parse_ref(self, segment: str, result: Dict):
+    def _parse_ref(self, parts: List[str], result: Dict):
         """Parse REF segment for reference information"""
-        parts = segment.split('*')
-        result['raw_segments']['REF'].append(segment)
-        
         if len(parts) < 3:
             return
         
         ref_qualifier = parts[1]
-        ref_value = parts[2].rstrip('~')
-        
-        # Common reference qualifiers
-        ref_types = {
-            '1L': 'Group Number',
-            '18': 'Plan Number',
-            '49': 'Family Unit Number',
-            '6P': 'Group ID',
-            'HJ': 'Identity Card Number',
-            'IG': 'Insurance Policy Number',
-            'N6': 'Plan Network ID',
-            'SY': 'Social Security Number',
-            'ZZ': 'Mutually Defined'
-        }
+        ref_value = parts[2]
         
-        if ref_qualifier in ref_types:
-            result['plan_info'][ref_types[ref_qualifier]] = ref_value
+        field = self.REF_TYPES.get(ref_qualifier)
+        if field:
+            result['plan_info'][field] = ref_value
     
-    def _parse_msg(self, segment: str, result: Dict):
+    def _parse_msg(self, parts: List[str], result: Dict):
         """Parse MSG segment for free-form messages"""
-        parts = segment.split('*')
         if len(parts) > 1:
-            message = parts[1].rstrip('~')
+            message = parts[1]
             result['warnings'].append(message)
     
     def _determine_ffs_status(self, result: Dict):
         """Determine if the patient qualifies for FFS based on all parsed data"""
 
         # Check if Utah Medicaid is the payer
-        is_utah_medicaid = result.get('payer_info', {}).get('is_utah_medicaid', False)
+        is_utah_medicaid = result['payer_info'].get('is_utah_medicaid', False)
 
         # Check for managed care indicators (already filtered for non-transportation)
-        has_managed_care = result.get('managed_care_detected', False)
+        has_managed_care = result['managed_care_detected']
 
         # Check program type
-        program = result.get('plan_info', {}).get('program', '')
-
-        # Check for active eligibility - ignore transportation entries
-        has_active_coverage = any(
-            (detail.get('code') in ['1', '2', '3', '4', '5'] or
-            'Active' in detail.get('status', '')) and
-            'TRANSPORTATION' not in detail.get('plan_description', '').upper()
-            for detail in result.get('eligibility_details', [])
-        )
+        program = result['plan_info'].get('program', '')
 
-        # Check if we found TRADITIONAL ADULT in any EB segment - this is TAM
-        has_traditional_adult = any(
-            'TRADITIONAL ADULT' in detail.get('plan_description', '').upper()
-            for detail in result.get('eligibility_details', [])
-        )
+        # Active eligibility (transportation entries ignored) and TRADITIONAL ADULT
+        # (TAM) were flagged by _parse_eb as each EB segment was read
+        flags = result['_flags']
+        has_active_coverage = flags['has_active']
+        has_traditional_adult = flags['has_traditional_adult']
 
         # Determine final FFS status - STRICT TAM-ONLY QUALIFICATION
         if not has_active_coverage:
@@ -466,10 +537,9 @@ class X12_271Parser:
     def _generate_summary(self, result: Dict) -> str:
         """Generate a human-readable summary of eligibility status"""
 
-        ffs_status = result.get('ffs_status', 'UNKNOWN')
-        qualification = result.get('ffs_qualification', 'UNKNOWN')
-        patient = result.get('patient_info', {})
-        plan = result.get('plan_info', {})
+        ffs_status = result['ffs_status']
+        qualification = result['ffs_qualification']
+        patient = result['patient_info']
 
         name = f"{patient.get('first_name', '')} {patient.get('last_name', '')}".strip()
 
@@ -497,53 +567,70 @@ class X12_271Parser:
     def format_response(self, parsed_result: Dict) -> str:
         """Format parsed response for display"""
         
-        lines = []
-        lines.append("\n" + "="*60)
-        lines.append("X12 271 ELIGIBILITY RESPONSE ANALYSIS")
-        lines.append("="*60)
+        buf = io.StringIO()
+        w = buf.write
+        w(f"\n{'=' * 60}\nX12 271 ELIGIBILITY RESPONSE ANALYSIS\n{'=' * 60}\n")
         
         # Patient Information
-        if parsed_result.get('patient_info'):
-            patient = parsed_result['patient_info']
-            lines.append("\nPATIENT INFORMATION:")
-            lines.append(f"  Name: {patient.get('first_name', '')} {patient.get('last_name', '')}")
-            if patient.get('member_id'):
-                lines.append(f"  Member ID: {patient['member_id']}")
+        patient = parsed_result.get('patient_info')
+        if patient:
+            w("\nPATIENT INFORMATION:\n")
+            w(f"  Name: {patient.get('first_name', '')} {patient.get('last_name', '')}\n")
+            member_id = patient.get('member_id')
+            if member_id:
+                w(f"  Member ID: {member_id}\n")
         
         # Payer Information
-        if parsed_result.get('payer_info'):
-            payer = parsed_result['payer_info']
-            lines.append("\nPAYER INFORMATION:")
-            lines.append(f"  Name: {payer.get('name', 'Unknown')}")
-            if payer.get('id'):
-                lines.append(f"  ID: {payer['id']}")
+        payer = parsed_result.get('payer_info')
+        if payer:
+            w("\nPAYER INFORMATION:\n")
+            w(f"  Name: {payer.get('name', 'Unknown')}\n")
+            payer_id = payer.get('id')
+            if payer_id:
+                w(f"  ID: {payer_id}\n")
         
         # Eligibility Status
-        lines.append("\nELIGIBILITY STATUS:")
-        lines.append(f"  Overall Status: {'✅ ELIGIBLE' if parsed_result.get('eligible') else '❌ NOT ELIGIBLE'}")
-        lines.append(f"  FFS Status: {parsed_result.get('ffs_status', 'UNKNOWN')}")
-        lines.append(f"  CM Qualification: {parsed_result.get('ffs_qualification', 'UNKNOWN')}")
+        w("\nELIGIBILITY STATUS:\n")
+        w(f"  Overall Status: {'✅ ELIGIBLE' if parsed_result.get('eligible') else '❌ NOT ELIGIBLE'}\n")
+        w(f"  FFS Status: {parsed_result.get('ffs_status', 'UNKNOWN')}\n")
+        w(f"  CM Qualification: {parsed_result.get('ffs_qualification', 'UNKNOWN')}\n")
         
         # Eligibility Details
-        if parsed_result.get('eligibility_details'):
-            lines.append("\nELIGIBILITY DETAILS:")
-            for detail in parsed_result['eligibility_details']:
-                lines.append(f"  - {detail.get('status', 'Unknown')}")
-                if detail.get('plan_description'):
-                    lines.append(f"    Plan: {detail['plan_description']}")
-                if detail.get('service_types'):
-                    lines.append(f"    Services: {detail['service_types']}")
+        eligibility_details = parsed_result.get('eligibility_details')
+        if eligibility_details:
+            w("\nELIGIBILITY DETAILS:\n")
+            for detail in eligibility_details:
+                w(f"  - {detail.get('status', 'Unknown')}\n")
+                plan_description = detail.get('plan_description')
+                if plan_description:
+                    w(f"    Plan: {plan_description}\n")
+                service_types = detail.get('service_types')
+                if service_types:
+                    w(f"    Services: {service_types}\n")
         
         # Errors
-        if parsed_result.get('errors'):
-            lines.append("\n⚠️ ERRORS:")
-            for error in parsed_result['errors']:
-                lines.append(f"  - {error.get('code', '')}: {error.get('description', 'Unknown error')}")
+        errors = parsed_result.get('errors')
+        if errors:
+            w("\n⚠️ ERRORS:\n")
+            for error in errors:
+                w(f"  - {error.get('code', '')}: {error.get('description', 'Unknown error')}\n")
         
         # Summary
-        lines.append("\nSUMMARY:")
-        lines.append(f"  {parsed_result.get('summary', 'No summary available')}")
+        w("\nSUMMARY:\n")
+        w(f"  {parsed_result.get('summary', 'No summary available')}\n")
         
-        lines.append("\n" + "="*60)
+        w(f"\n{'=' * 60}")
         
-        return '\n'.join(lines)
\ No newline at end of file
+        return buf.getvalue()
+
+
+# Parser reused by each parse_many() worker process
+_worker_parser = None
+
+
+def _parse_in_worker(x12_271: str, keep_raw: bool) -> Dict:
+    """Parse one response inside a parse_many() worker process"""
+    global _worker_parser
+    if _worker_parser is None:
+        _worker_parser = X12_271Parser()
+    return _worker_parser.parse(x12_271, keep_raw)
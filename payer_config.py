@@ -3,6 +3,7 @@ Payer Configuration Module for UHIN Eligibility Checking
 Manages different payer configurations for X12 270/271 transactions
 """
 
+from functools import lru_cache
 from typing import Dict, Optional
 
 class PayerConfig:
@@ -86,9 +87,42 @@ class PayerConfig:
             payer_key: Key identifying the payer (e.g., 'UTAH_MEDICAID', 'U_OF_U_HEALTH')
 
         Returns:
-            Payer configuration dictionary or None if not found
+            Copy of the payer configuration dictionary or None if not found
         """
-        return cls.PAYERS.get(payer_key.upper())
+        config = cls.PAYERS.get(payer_key.upper())
+        return dict(config) if config is not None else None
+
+    @classmethod
+    def register_payer(cls, payer_key: str, config: Dict):
+        """
+        Add or replace a payer configuration at runtime
+
+        Lookups are memoized, so always go through this method rather than
+        assigning to PAYERS directly.
+
+        Args:
+            payer_key: Key identifying the payer (stored upper-cased, as get_payer looks it up)
+            config: Payer configuration dictionary (same fields as PAYERS entries)
+        """
+        cls.PAYERS[payer_key.upper()] = config
+        cls.clear_cache()
+
+    @classmethod
+    def unregister_payer(cls, payer_key: str):
+        """
+        Remove a payer added with register_payer (no-op if it isn't registered)
+
+        Args:
+            payer_key: Key identifying the payer
+        """
+        if cls.PAYERS.pop(payer_key.upper(), None) is not None:
+            cls.clear_cache()
+
+    @classmethod
+    def clear_cache(cls):
+        """Drop memoized lookups after PAYERS has changed"""
+        cls.format_x12_payer_name.cache_clear()
+        cls._payers_by_id.cache_clear()
 
     @classmethod
     def get_payer_by_id(cls, payer_id: str) -> Optional[Dict]:
@@ -99,12 +133,21 @@ class PayerConfig:
             payer_id: Payer ID (e.g., 'SX155', 'HT000004-001')
 
         Returns:
-            Payer configuration dictionary or None if not found
+            Copy of the payer configuration dictionary or None if not found
         """
-        for key, config in cls.PAYERS.items():
-            if config['payer_id'] == payer_id or config.get('receiver_id') == payer_id:
-                return config
-        return None
+        config = cls._payers_by_id().get(payer_id)
+        return dict(config) if config is not None else None
+
+    @classmethod
+    @lru_cache(maxsize=1)
+    def _payers_by_id(cls) -> Dict[str, Dict]:
+        """Reverse index of payer_id/receiver_id -> payer config (first match in PAYERS order wins)"""
+        index = {}
+        for config in cls.PAYERS.values():
+            index.setdefault(config['payer_id'], config)
+            if config.get('receiver_id'):
+                index.setdefault(config['receiver_id'], config)
+        return index
 
     @classmethod
     def list_payers(cls) -> Dict[str, str]:
@@ -112,7 +155,7 @@ class PayerConfig:
         Get a list of all available payers
 
         Returns:
-            Dictionary of payer keys to names
+            Dictionary of payer keys to names (a new dict on every call)
         """
         return {key: config['name'] for key, config in cls.PAYERS.items()}
 
@@ -140,6 +183,7 @@ class PayerConfig:
         return True, f"Payer '{payer['name']}' is properly configured"
 
     @classmethod
+    @lru_cache(maxsize=64)
     def format_x12_payer_name(cls, payer_key: str, test_mode: bool = False) -> tuple[str, str, str]:
         """
         Get X12-formatted payer information
@@ -4,21 +4,94 @@ Handles SOAP envelope creation with WS-Security and HTTP communication
 """
 
 import requests
-import uuid
-from datetime import datetime
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import re
+import time
+from datetime import datetime, timezone
 from typing import Dict, Optional, Tuple
-import xml.etree.ElementTree as ET
 import logging
-from xml.sax.saxutils import escape
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# SOAP envelope; credentials/IDs are filled once per client, the per-request
+# fields (wsu_id, payload_id, timestamp, payload) on every call
+_ENVELOPE_TEMPLATE = """<?xml version="1.0" encoding="utf-8"?>
+<soap:Envelope xmlns:soap="http://www.w3.org/2003/05/soap-envelope" 
+               xmlns:cor="http://www.caqh.org/SOAP/WSDL/CORERule2.2.0.xsd">
+    <soap:Header>
+        <wsse:Security soap:mustUnderstand="true" 
+                       xmlns:wsse="http://docs.oasis-open.org/wss/2004/01/oasis-200401-wss-wssecurity-secext-1.0.xsd"
+                       xmlns:wsu="http://docs.oasis-open.org/wss/2004/01/oasis-200401-wss-wssecurity-utility-1.0.xsd">
+            <wsse:UsernameToken wsu:Id="{wsu_id}">
+                <wsse:Username>{username}</wsse:Username>
+                <wsse:Password Type="http://docs.oasis-open.org/wss/2004/01/oasis-200401-wss-username-token-profile-1.0#PasswordText">{password}</wsse:Password>
+            </wsse:UsernameToken>
+        </wsse:Security>
+    </soap:Header>
+    <soap:Body>
+        <cor:COREEnvelopeRealTimeRequest>
+            <PayloadType>X12_270_Request_005010X279A1</PayloadType>
+            <ProcessingMode>RealTime</ProcessingMode>
+            <PayloadID>{payload_id}</PayloadID>
+            <TimeStamp>{timestamp}</TimeStamp>
+            <SenderID>{trading_partner}</SenderID>
+            <ReceiverID>{receiver_id}</ReceiverID>
+            <CORERuleVersion>2.2.0</CORERuleVersion>
+            <Payload>{payload}</Payload>
+        </cor:COREEnvelopeRealTimeRequest>
+    </soap:Body>
+</soap:Envelope>"""
+
+# Order in which per-request fields appear in _ENVELOPE_TEMPLATE
+_ENVELOPE_REQUEST_FIELDS = ('wsu_id', 'payload_id', 'timestamp', 'payload')
+
+# Static HTTP headers sent with every SOAP request
+_REQUEST_HEADERS = {
+    'Content-Type': 'application/soap+xml; charset=utf-8',
+    'SOAPAction': 'http://www.caqh.org/SOAP/WSDL/CORERule2.2.0.xsd/COREEnvelopeRealTimeRequest',
+    'Accept': 'application/soap+xml, text/xml',
+    'User-Agent': 'UHIN-Python-Client/1.0'
+}
+
+# Response extraction patterns, compiled once for all responses
+_PAYLOAD_RE = re.compile(r'<(?:(?:soap|cor|wsse|wsu):)?Payload[^>]*>(.*?)</(?:(?:soap|cor|wsse|wsu):)?Payload>',
+                         re.DOTALL)
+_CODE_RE = re.compile(r'<.*?Code>(.*?)</.*?Code>')
+_REASON_RE = re.compile(r'<.*?(?:Reason|String)>(.*?)</.*?(?:Reason|String)>')
+_DETAIL_RE = re.compile(r'<.*?Detail>(.*?)</.*?Detail>')
+# SOAP Fault, ErrorCode and ErrorMessage in one scan of the response. The Fault
+# branch is tried first and starts at the earliest '<', so when a Fault exists
+# it is always the first match
+_ERROR_RE = re.compile(
+    r'(?s:<.*?Fault>(?P<fault>.*?)</.*?Fault>)'
+    r'|<ErrorCode>(?P<error_code>.*?)</ErrorCode>'
+    r'|<ErrorMessage>(?P<error_message>.*?)</ErrorMessage>'
+)
+
+# XML-escapes the X12 payload in one C-level pass (same output as saxutils.escape)
+_X12_ESCAPE_TABLE = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;'})
+
+# Predefined XML entities, unescaped from the payload in a single pass
+_ENTITY_RE = re.compile(r'&(lt|gt|amp|quot|apos);')
+_ENTITIES = {'lt': '<', 'gt': '>', 'amp': '&', 'quot': '"', 'apos': "'"}
+
 
 class SOAPClient:
     """Handles SOAP communication with UHIN UTRANSEND clearinghouse"""
     
-    def __init__(self, config: Dict[str, str]):
+    # Keep-alive pool and retry policy for a session this client creates itself
+    POOL_CONNECTIONS = 4
+    POOL_MAXSIZE = 16
+    # Retry the POST only when UHIN can't have processed it: connection failures
+    # and 503 Service Unavailable (the last 503 response is returned rather than
+    # raised). Read timeouts (read=False) and 502/504 gateway errors may follow a
+    # 270 UHIN already accepted, so they are never resent; a timeout surfaces as
+    # requests.Timeout
+    RETRY = Retry(total=3, read=False, backoff_factor=0.3, status_forcelist=(503,),
+                  allowed_methods=frozenset({'POST'}), raise_on_status=False)
+    
+    def __init__(self, config: Dict[str, str], session: Optional[requests.Session] = None):
         """
         Initialize the SOAP client
         
@@ -29,18 +102,50 @@ class SOAPClient:
                 - password: UHIN password
                 - trading_partner: Trading partner ID
                 - receiver_id: Receiver ID
+            session: Optional shared requests.Session; pass one in to reuse
+                pooled keep-alive connections across clients
+        
+        One client can be reused for any number of requests (and from several
+        threads) so they share its connection pool instead of re-handshaking.
         """
         self.config = config
         self.endpoint = config.get('endpoint', 'https://ws.uhin.org/webservices/core/soaptype4.asmx')
-        self.session = requests.Session()
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=self.POOL_CONNECTIONS,
+                                  pool_maxsize=self.POOL_MAXSIZE,
+                                  max_retries=self.RETRY)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+        self.session = session
+        # (config values, fragments, UTF-8 fragments) - one attribute so readers
+        # never see a mismatched set
+        self._envelope = (None, None, None)
         
-    def generate_uuid(self) -> str:
-        """Generate a UUID v4 string (36 characters as required by UHIN)"""
-        return str(uuid.uuid4())
-    
-    def generate_wsu_id(self) -> str:
-        """Generate a unique WSU ID for UsernameToken"""
-        return f"UsernameToken-{uuid.uuid4().hex[:8]}"
+    def _envelope_fragments(self, encoded: bool = False) -> Tuple:
+        """
+        Return the static envelope text around the per-request fields
+        
+        Rendered once and reused until one of the config values it embeds
+        changes (callers may update receiver_id on a shared config).
+        
+        Args:
+            encoded: If True, return the fragments pre-encoded as UTF-8 bytes
+        """
+        key = (self.config['username'], self.config['password'],
+               self.config['trading_partner'], self.config['receiver_id'])
+        cached_key, fragments, encoded_fragments = self._envelope
+        if cached_key != key:
+            marker = '\x00'
+            rendered = _ENVELOPE_TEMPLATE.format(
+                username=key[0], password=key[1],
+                trading_partner=key[2], receiver_id=key[3],
+                **dict.fromkeys(_ENVELOPE_REQUEST_FIELDS, marker)
+            )
+            fragments = tuple(rendered.split(marker))
+            encoded_fragments = tuple(fragment.encode('utf-8') for fragment in fragments)
+            self._envelope = (key, fragments, encoded_fragments)
+        return encoded_fragments if encoded else fragments
     
     def create_soap_envelope(self, x12_payload: str) -> str:
         """
@@ -52,50 +157,48 @@ class SOAPClient:
         Returns:
             Complete SOAP envelope as string
         """
+        head, after_wsu_id, after_payload_id, after_timestamp, tail = self._envelope_fragments()
+        wsu_id, payload_id, timestamp, escaped_payload = self._request_fields(x12_payload)
+        
+        # Splice the per-request values between the cached envelope fragments
+        return ''.join((
+            head, wsu_id, after_wsu_id, payload_id, after_payload_id,
+            timestamp, after_timestamp, escaped_payload, tail
+        ))
+    
+    def _encode_soap_envelope(self, x12_payload: str) -> bytes:
+        """Create the SOAP envelope as UTF-8 bytes, ready to POST"""
+        head, after_wsu_id, after_payload_id, after_timestamp, tail = self._envelope_fragments(encoded=True)
+        wsu_id, payload_id, timestamp, escaped_payload = self._request_fields(x12_payload)
+        
+        # Only the per-request values need encoding; the fragments are cached as bytes
+        return b''.join((
+            head, wsu_id.encode('ascii'), after_wsu_id, payload_id.encode('ascii'), after_payload_id,
+            timestamp.encode('ascii'), after_timestamp, escaped_payload.encode('utf-8'), tail
+        ))
+    
+    def _request_fields(self, x12_payload: str) -> Tuple[str, str, str, str]:
+        """Return the per-request (wsu_id, payload_id, timestamp, escaped payload)"""
+        # One clock read for every time-derived field
+        seconds, millis = divmod(time.time_ns() // 1_000_000, 1000)
+        now = datetime.fromtimestamp(seconds, tz=timezone.utc)
+        
         # UHIN timestamp format with milliseconds
-        now = datetime.utcnow()
-        timestamp = now.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'  # 3 decimal places for milliseconds
+        timestamp = f"{now:%Y-%m-%dT%H:%M:%S}.{millis:03d}Z"
         
         # PayloadID must be exactly 36 characters - pad the control number
-        control_number = str(int(now.timestamp()))[-9:]
+        control_number = str(seconds)[-9:]
         # Format: EHR_UHIN_[9 digits]_[date] then pad to 36 chars
-        base_id = f"EHR_UHIN_{control_number}_{now.strftime('%Y%m%d')}"
+        base_id = f"EHR_UHIN_{control_number}_{now:%Y%m%d}"
         payload_id = base_id.ljust(36, '0')  # Pad with zeros to reach 36 chars
         
         # WSU ID format matching UHIN guide
         wsu_id = f"UsernameToken-{control_number[:8]}"
         
         # Escape the X12 payload for XML
-        escaped_payload = escape(x12_payload)
+        escaped_payload = x12_payload.translate(_X12_ESCAPE_TABLE)
         
-        soap_envelope = f"""<?xml version="1.0" encoding="utf-8"?>
-<soap:Envelope xmlns:soap="http://www.w3.org/2003/05/soap-envelope" 
-               xmlns:cor="http://www.caqh.org/SOAP/WSDL/CORERule2.2.0.xsd">
-    <soap:Header>
-        <wsse:Security soap:mustUnderstand="true" 
-                       xmlns:wsse="http://docs.oasis-open.org/wss/2004/01/oasis-200401-wss-wssecurity-secext-1.0.xsd"
-                       xmlns:wsu="http://docs.oasis-open.org/wss/2004/01/oasis-200401-wss-wssecurity-utility-1.0.xsd">
-            <wsse:UsernameToken wsu:Id="{wsu_id}">
-                <wsse:Username>{self.config['username']}</wsse:Username>
-                <wsse:Password Type="http://docs.oasis-open.org/wss/2004/01/oasis-200401-wss-username-token-profile-1.0#PasswordText">{self.config['password']}</wsse:Password>
-            </wsse:UsernameToken>
-        </wsse:Security>
-    </soap:Header>
-    <soap:Body>
-        <cor:COREEnvelopeRealTimeRequest>
-            <PayloadType>X12_270_Request_005010X279A1</PayloadType>
-            <ProcessingMode>RealTime</ProcessingMode>
-            <PayloadID>{payload_id}</PayloadID>
-            <TimeStamp>{timestamp}</TimeStamp>
-            <SenderID>{self.config['trading_partner']}</SenderID>
-            <ReceiverID>{self.config['receiver_id']}</ReceiverID>
-            <CORERuleVersion>2.2.0</CORERuleVersion>
-            <Payload>{escaped_payload}</Payload>
-        </cor:COREEnvelopeRealTimeRequest>
-    </soap:Body>
-</soap:Envelope>"""
-        
-        return soap_envelope
+        return wsu_id, payload_id, timestamp, escaped_payload
     
     def send_request(self, x12_payload: str, timeout: int = 30) -> Tuple[bool, str, Optional[str]]:
         """
@@ -109,33 +212,38 @@ class SOAPClient:
             Tuple of (success, response_text, error_message)
         """
         try:
-            soap_envelope = self.create_soap_envelope(x12_payload)
+            soap_envelope = self._encode_soap_envelope(x12_payload)
             
-            logger.info(f"Sending request to {self.endpoint}")
-            logger.debug(f"SOAP envelope size: {len(soap_envelope)} bytes")
-            
-            headers = {
-                'Content-Type': 'application/soap+xml; charset=utf-8',
-                'SOAPAction': 'http://www.caqh.org/SOAP/WSDL/CORERule2.2.0.xsd/COREEnvelopeRealTimeRequest',
-                'Accept': 'application/soap+xml, text/xml',
-                'User-Agent': 'UHIN-Python-Client/1.0'
-            }
+            logger.info("Sending request to %s", self.endpoint)
+            logger.debug("SOAP envelope size: %d bytes", len(soap_envelope))
             
             response = self.session.post(
                 self.endpoint,
-                data=soap_envelope.encode('utf-8'),
-                headers=headers,
+                data=soap_envelope,
+                headers=_REQUEST_HEADERS,
                 timeout=timeout
             )
             
-            logger.info(f"Response status: {response.status_code}")
+            status_code = response.status_code
+            logger.info("Response status: %s", status_code)
+            
+            # Without a charset in Content-Type (common for application/soap+xml),
+            # requests would run charset detection over the whole body to build .text
+            if not response.encoding:
+                response.encoding = 'utf-8'
             
-            if response.status_code == 200:
+            if status_code == 200:
                 return True, response.text, None
-            else:
-                error_msg = f"HTTP {response.status_code}: {response.reason}"
-                logger.error(error_msg)
+            
+            error_msg = f"HTTP {status_code}: {response.reason}"
+            logger.error(error_msg)
+            # Only decode error bodies that can carry SOAP fault details; proxy and
+            # gateway error pages are usually HTML that extract_error_info can't use
+            body = response.content
+            if b'Fault' in body or b'ErrorCode' in body or b'ErrorMessage' in body:
                 return False, response.text, error_msg
+            logger.debug("Discarding %d-byte non-SOAP error body", len(body))
+            return False, "", error_msg
                 
         except requests.exceptions.Timeout:
             error_msg = f"Request timed out after {timeout} seconds"
@@ -163,40 +271,20 @@ class SOAPClient:
             X12 271 message or None if not found
         """
         try:
-            # Try regex extraction first (more forgiving)
-            import re
-            payload_match = re.search(r'<Payload[^>]*>(.*?)</Payload>', soap_response, re.DOTALL)
+            # Regex extraction (more forgiving than a DOM parse; also accepts
+            # a soap:/cor:/wsse:/wsu: prefixed Payload element)
+            payload_match = _PAYLOAD_RE.search(soap_response)
             if payload_match:
                 x12_response = payload_match.group(1).strip()
                 # Unescape XML entities
-                x12_response = x12_response.replace('&lt;', '<')
-                x12_response = x12_response.replace('&gt;', '>')
-                x12_response = x12_response.replace('&amp;', '&')
-                x12_response = x12_response.replace('&quot;', '"')
-                x12_response = x12_response.replace('&apos;', "'")
+                x12_response = _ENTITY_RE.sub(lambda m: _ENTITIES[m.group(1)], x12_response)
                 return x12_response
             
-            # Fallback to XML parsing if regex fails
-            # Remove namespace prefixes for easier parsing
-            soap_clean = soap_response
-            for ns in ['soap:', 'cor:', 'wsse:', 'wsu:']:
-                soap_clean = soap_clean.replace(f'<{ns}', '<').replace(f'</{ns}', '</')
-            
-            root = ET.fromstring(soap_clean)
-            
-            # Find Payload element
-            payload_elem = root.find('.//Payload')
-            if payload_elem is not None and payload_elem.text:
-                return payload_elem.text.strip()
-            
             logger.warning("No Payload element found in SOAP response")
             return None
             
-        except ET.ParseError as e:
-            logger.error(f"XML parsing error: {str(e)}")
-            return None
         except Exception as e:
-            logger.error(f"Error extracting X12 response: {str(e)}")
+            logger.error("Error extracting X12 response: %s", e)
             return None
     
     def extract_error_info(self, soap_response: str) -> Optional[Dict[str, str]]:
@@ -210,48 +298,53 @@ class SOAPClient:
             Dictionary with error details or None
         """
         try:
-            import re
-            
-            # Look for SOAP Fault
-            fault_match = re.search(r'<.*?Fault>(.*?)</.*?Fault>', soap_response, re.DOTALL)
-            if fault_match:
-                fault_content = fault_match.group(1)
+            error_code = error_message = None
+            for match in _ERROR_RE.finditer(soap_response):
+                fault_content = match.group('fault')
+                if fault_content is not None:
+                    return self._extract_fault_info(fault_content)
                 
-                error_info = {}
-                
-                # Extract fault code
-                code_match = re.search(r'<.*?Code>(.*?)</.*?Code>', fault_content)
-                if code_match:
-                    error_info['code'] = code_match.group(1).strip()
-                
-                # Extract fault reason/string
-                reason_match = re.search(r'<.*?(?:Reason|String)>(.*?)</.*?(?:Reason|String)>', fault_content)
-                if reason_match:
-                    error_info['reason'] = reason_match.group(1).strip()
-                
-                # Extract detail
-                detail_match = re.search(r'<.*?Detail>(.*?)</.*?Detail>', fault_content)
-                if detail_match:
-                    error_info['detail'] = detail_match.group(1).strip()
-                
-                return error_info if error_info else None
-            
-            # Look for ErrorCode and ErrorMessage in response
-            error_code_match = re.search(r'<ErrorCode>(.*?)</ErrorCode>', soap_response)
-            error_msg_match = re.search(r'<ErrorMessage>(.*?)</ErrorMessage>', soap_response)
+                # Keep the first ErrorCode / ErrorMessage seen
+                if error_code is None:
+                    error_code = match.group('error_code')
+                if error_message is None:
+                    error_message = match.group('error_message')
+                if error_code is not None and error_message is not None:
+                    break
             
-            if error_code_match or error_msg_match:
+            if error_code is not None or error_message is not None:
                 return {
-                    'code': error_code_match.group(1) if error_code_match else 'Unknown',
-                    'message': error_msg_match.group(1) if error_msg_match else 'Unknown error'
+                    'code': error_code if error_code is not None else 'Unknown',
+                    'message': error_message if error_message is not None else 'Unknown error'
                 }
             
             return None
             
         except Exception as e:
-            logger.error(f"Error extracting error info: {str(e)}")
+            logger.error("Error extracting error info: %s", e)
             return None
     
+    def _extract_fault_info(self, fault_content: str) -> Optional[Dict[str, str]]:
+        """Extract code, reason and detail from the body of a SOAP Fault"""
+        error_info = {}
+        
+        # Extract fault code
+        code_match = _CODE_RE.search(fault_content)
+        if code_match:
+            error_info['code'] = code_match.group(1).strip()
+        
+        # Extract fault reason/string
+        reason_match = _REASON_RE.search(fault_content)
+        if reason_match:
+            error_info['reason'] = reason_match.group(1).strip()
+        
+        # Extract detail
+        detail_match = _DETAIL_RE.search(fault_content)
+        if detail_match:
+            error_info['detail'] = detail_match.group(1).strip()
+        
+        return error_info if error_info else None
+    
     def check_eligibility(self, x12_270: str) -> Dict[str, any]:
         """
         High-level method to check eligibility
@@ -7,14 +7,15 @@ Tests the credentials and connection to UHIN's UTRANSEND clearinghouse
 import os
 import sys
 from pathlib import Path
-from dotenv import load_dotenv
-
-# Load credentials from .env.local
-load_dotenv('.env.local')
 
 # Add current directory to path
 sys.path.insert(0, str(Path(__file__).parent))
 
+from env_bootstrap import ensure_env_loaded
+
+# Load credentials from .env.local
+ensure_env_loaded()
+
 from main import UHINEligibilityChecker
 
 
@@ -13,31 +13,40 @@ import xml.etree.ElementTree as ET
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# SOAP 1.2 Reason/Text and SOAP 1.1 faultstring; {*} matches any namespace,
+# so the lookup doesn't depend on the envelope namespace URI or prefix
+_FAULT_TEXT_PATHS = ('.//{*}Text', './/{*}faultstring')
+
 def extract_soap_fault(error_text):
     """Extract SOAP fault details from error response"""
+    if not error_text:
+        return None
+
+    # Most checker errors are plain text; don't run the XML parser on them
+    stripped = error_text.lstrip()
+    if not stripped.startswith('<'):
+        return None
+
     try:
         # Parse the XML
-        root = ET.fromstring(error_text)
-
-        # Find the fault text
-        namespaces = {
-            'soapenv': 'http://www.w3.org/2003/05/soap-envelope/',
-            'soap': 'http://schemas.xmlsoap.org/soap/envelope/'
-        }
+        root = ET.fromstring(stripped)
+    except ET.ParseError:
+        return None
 
-        # Try SOAP 1.2 first
-        fault_text = root.find('.//soapenv:Text', namespaces)
+    # Find the fault text: SOAP 1.2 first, then SOAP 1.1
+    for path in _FAULT_TEXT_PATHS:
+        fault_text = root.findtext(path)
         if fault_text is not None:
-            return fault_text.text
+            return fault_text
 
-        # Try SOAP 1.1
-        fault_string = root.find('.//faultstring')
-        if fault_string is not None:
-            return fault_string.text
+    return None
 
-        return None
-    except:
-        return None
+def fault_message(result):
+    """SOAP fault text for a failed check result (raw fault body, then parsed fault)"""
+    fault_msg = extract_soap_fault(result.get('raw_response'))
+    if fault_msg is None and result.get('soap_fault'):
+        fault_msg = result['soap_fault'].get('reason')
+    return fault_msg
 
 def test_uofu_detailed():
     """Test U of U Health Plans with detailed error reporting"""
@@ -92,7 +101,7 @@ def test_uofu_detailed():
         error = result.get('error', 'Unknown error')
 
         # Extract detailed error
-        fault_msg = extract_soap_fault(error)
+        fault_msg = fault_message(result)
 
         if fault_msg:
             print(f"❌ U of U Health Plans SOAP Fault:")
@@ -134,7 +143,7 @@ def test_uofu_detailed():
             print(f"   Patient: {result['patient_info']}")
     else:
         error = result.get('error', 'Unknown error')
-        fault_msg = extract_soap_fault(error)
+        fault_msg = fault_message(result)
 
         if fault_msg:
             print(f"❌ With Member ID SOAP Fault:")
@@ -4,14 +4,39 @@ Test script for U of U Health Plans eligibility checking
 Tries different payer ID variations to find the correct routing
 """
 
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from multi_payer_checker import MultiPayerEligibilityChecker
 from payer_config import PayerConfig
 import logging
+import sys
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Per-probe status lines are skipped with --quiet (e.g. nightly --all batches);
+# headers and successful responses are always printed
+VERBOSE = '--quiet' not in sys.argv
+
+# Probes in flight at once; a small pool lets queued probes be cancelled once
+# one payer ID succeeds, so the rest never reach production UHIN
+MAX_PROBE_WORKERS = 2
+
+# Payer config fields shared by every U of U payer ID probe (tuples so the
+# registered configs can share them)
+_UOFU_PROBE_TEMPLATE = {
+    'payer_name': 'U OF U HEALTH PLANS',
+    'eligibility_segments': ('30', '48'),
+    'supported_services': ('medical', 'behavioral_health'),
+    'identifier_type': 'MI',
+    'requires_member_id': False,  # Try without member ID first
+    'test_receiver_id': None
+}
+
+def failure_text(result):
+    """Error message plus the raw SOAP fault body, for matching known UHIN errors"""
+    return f"{result.get('error', 'Unknown error')}\n{result.get('raw_response') or ''}"
+
 def test_patient():
     """Test patient information"""
     return {
@@ -21,7 +46,7 @@ def test_patient():
         'gender': 'M'
     }
 
-def test_uofu_variations():
+def test_uofu_variations(checker=None):
     """Test different U of U Health Plans payer ID variations"""
 
     # Possible variations based on common patterns
@@ -34,7 +59,8 @@ def test_uofu_variations():
         ('HT000155', 'UHIN Format - HT Prefix'),
     ]
 
-    checker = MultiPayerEligibilityChecker()
+    # Pass a checker in to reuse its HTTPS session across test runs
+    checker = checker or MultiPayerEligibilityChecker()
     patient = test_patient()
 
     print("\n" + "="*70)
@@ -56,51 +82,78 @@ def test_uofu_variations():
     # Now test U of U Health Plans variations
     print("\n✗ Testing U of U Health Plans Variations:")
 
+    # Register every variation under its own key up front so concurrent probes
+    # never see each other's config
     for payer_id, description in uofu_variations:
-        print(f"\n  Testing: {payer_id} ({description})")
-
-        # Temporarily update the payer config
-        PayerConfig.PAYERS['U_OF_U_HEALTH_TEST'] = {
+        PayerConfig.register_payer(f'U_OF_U_HEALTH_TEST_{payer_id}', {
+            **_UOFU_PROBE_TEMPLATE,
             'name': f'U of U Health Plans Test - {payer_id}',
             'payer_id': payer_id,
-            'payer_name': 'U OF U HEALTH PLANS',
             'payer_code': payer_id,
             'receiver_id': payer_id,
-            'description': description,
-            'eligibility_segments': ['30', '48'],
-            'supported_services': ['medical', 'behavioral_health'],
-            'identifier_type': 'MI',
-            'requires_member_id': False,  # Try without member ID first
-            'test_receiver_id': None
-        }
+            'description': description
+        })
 
-        result = checker.check_eligibility(
-            payer_key='U_OF_U_HEALTH_TEST',
-            **patient
-        )
-
-        if result.get('success'):
-            print(f"    ✓ SUCCESS! Got valid response")
-            if result.get('patient_info'):
-                print(f"      Patient: {result['patient_info']}")
-            if result.get('interpretation'):
-                print(f"      Coverage: {result['interpretation']['coverage_type']}")
-                print(f"      Eligible: {result['interpretation']['is_eligible']}")
-            break  # Found working ID!
-        else:
-            error = result.get('error', 'Unknown error')
-            if 'No Route Found' in error:
-                print(f"    ✗ No route to payer ID {payer_id}")
-            elif 'Invalid' in error:
-                print(f"    ✗ Invalid payer ID format")
-            else:
-                print(f"    ✗ Error: {error[:100]}...")
+    try:
+        _run_uofu_probes(checker, patient, uofu_variations)
+    finally:
+        # Don't leave the temporary probe payers in the shared PayerConfig
+        for payer_id, _ in uofu_variations:
+            PayerConfig.unregister_payer(f'U_OF_U_HEALTH_TEST_{payer_id}')
 
     print("\n" + "="*70)
     print("Test Complete")
     print("="*70)
 
-def check_other_local_payers():
+def _run_uofu_probes(checker, patient, uofu_variations):
+    """Probe each registered U of U payer ID, stopping at the first success"""
+    probes = iter(uofu_variations)
+    futures = {}
+
+    def submit_next(executor):
+        # Start the next untried payer ID, if any are left
+        for payer_id, description in probes:
+            future = executor.submit(checker.check_eligibility,
+                                     payer_key=f'U_OF_U_HEALTH_TEST_{payer_id}', **patient)
+            futures[future] = (payer_id, description)
+            return
+
+    # Probes are independent UHIN round trips, so overlap a few at a time; a new
+    # one starts only after a failure, so nothing more is sent once one succeeds
+    with ThreadPoolExecutor(max_workers=MAX_PROBE_WORKERS) as executor:
+        for _ in range(MAX_PROBE_WORKERS):
+            submit_next(executor)
+
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                payer_id, description = futures.pop(future)
+                result = future.result()
+
+                if result.get('success'):
+                    print(f"\n  Tested: {payer_id} ({description})")
+                    print(f"    ✓ SUCCESS! Got valid response")
+                    if result.get('patient_info'):
+                        print(f"      Patient: {result['patient_info']}")
+                    if result.get('interpretation'):
+                        print(f"      Coverage: {result['interpretation']['coverage_type']}")
+                        print(f"      Eligible: {result['interpretation']['is_eligible']}")
+                    # Found working ID! Probes still in flight finish, no new ones start
+                    return
+
+                if VERBOSE:
+                    print(f"\n  Tested: {payer_id} ({description})")
+                    error = result.get('error', 'Unknown error')
+                    details = failure_text(result)
+                    if 'No Route Found' in details:
+                        print(f"    ✗ No route to payer ID {payer_id}")
+                    elif 'Invalid' in details:
+                        print(f"    ✗ Invalid payer ID format")
+                    else:
+                        print(f"    ✗ Error: {error[:100]}...")
+                submit_next(executor)
+
+def check_other_local_payers(checker=None):
     """Test other common Utah payers"""
 
     payers_to_test = [
@@ -109,7 +162,8 @@ def check_other_local_payers():
         'ANTHEM_BCBS'
     ]
 
-    checker = MultiPayerEligibilityChecker()
+    # Pass a checker in to reuse its HTTPS session across test runs
+    checker = checker or MultiPayerEligibilityChecker()
     patient = test_patient()
 
     print("\n" + "="*70)
@@ -118,7 +172,8 @@ def check_other_local_payers():
 
     for payer_key in payers_to_test:
         payer = PayerConfig.get_payer(payer_key)
-        print(f"\n• {payer['name']} (ID: {payer['payer_id']})")
+        if VERBOSE:
+            print(f"\n• {payer['name']} (ID: {payer['payer_id']})")
 
         result = checker.check_eligibility(
             payer_key=payer_key,
@@ -126,13 +181,15 @@ def check_other_local_payers():
         )
 
         if result.get('success'):
+            if not VERBOSE:
+                print(f"\n• {payer['name']} (ID: {payer['payer_id']})")
             print(f"  ✓ SUCCESS: Got response")
             interp = result.get('interpretation', {})
             print(f"    Coverage: {interp.get('coverage_type', 'Unknown')}")
             print(f"    Eligible: {interp.get('is_eligible', False)}")
-        else:
+        elif VERBOSE:
             error = result.get('error', 'Unknown error')
-            if 'No Route Found' in error:
+            if 'No Route Found' in failure_text(result):
                 print(f"  ✗ No route to payer")
             else:
                 print(f"  ✗ Error: {error[:100] if len(error) > 100 else error}")
@@ -140,13 +197,13 @@ def check_other_local_payers():
     print("\n" + "="*70)
 
 if __name__ == "__main__":
-    import sys
-
-    if len(sys.argv) > 1 and sys.argv[1] == '--all':
-        # Test all payers
-        test_uofu_variations()
-        check_other_local_payers()
-    else:
-        # Just test U of U Health Plans
-        test_uofu_variations()
-        print("\nRun with --all to test other local payers too")
\ No newline at end of file
+    # One checker (and keep-alive connection to UHIN) for every probe
+    with MultiPayerEligibilityChecker() as checker:
+        if '--all' in sys.argv[1:]:
+            # Test all payers
+            test_uofu_variations(checker)
+            check_other_local_payers(checker)
+        else:
+            # Just test U of U Health Plans
+            test_uofu_variations(checker)
+            print("\nRun with --all to test other local payers too (--quiet hides failed probes)")
\ No newline at end of file
@@ -4,13 +4,66 @@ Builds properly formatted X12 270 eligibility inquiry messages for Utah Medicaid
 """
 
 from datetime import datetime
-from typing import Dict, Optional
-import random
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+import asyncio
+import re
 
+from x12_builder_base import X12_270BuilderBase
 
-class X12_270Builder:
+# Whole ISA/IEA lines, for the control number cross-check in validate()
+_CONTROL_SEGMENT_RE = re.compile(r'^(ISA|IEA)[^\n]*', re.M)
+
+# Full 270 rendered in one format() call; segments joined with newlines for readability.
+# Config-only segment parts come from X12_270Builder._static_segments.
+_X12_270_TEMPLATE_NO_MID = '\n'.join((
+    # ISA - Interchange Control Header
+    "ISA*00*          *00*          {isa_ids}*{date_6}*{time_4}*^*00501*{control_number}*1*{test_flag}*:~",
+    # GS - Functional Group Header
+    "{gs_prefix}*{date_8}*{time_4}*{control_number}*X*005010X279A1~",
+    # ST - Transaction Set Header
+    "ST*270*0001*005010X279A1~",
+    # BHT - Beginning of Hierarchical Transaction (empty reference field like accepted example)
+    "BHT*0022*13**{date_8}*{time_4}~",
+    # HL - Hierarchical Level (Information Source - Payer)
+    "HL*1**20*1~",
+    # NM1 - Information Source Name (Payer) - matching accepted format exactly
+    "{payer_nm1}",
+    # HL - Hierarchical Level (Information Receiver - Provider)
+    "HL*2*1*21*1~",
+    # NM1 - Information Receiver Name (Provider) - using XX qualifier with NPI
+    "{provider_nm1}",
+    # HL - Hierarchical Level (Subscriber/Patient)
+    "HL*3*2*22*0~",
+    # TRN - Trace Number with sender ID (provider NPI) as originator
+    "TRN*1*{trace_number}*{originator}~",
+    # NM1 - Subscriber Name (without member ID, still include patient name)
+    "NM1*IL*1*{last_name}*{first_name}~",
+    # DMG - Demographic Information
+    "DMG*D8*{dob}*{gender}~",
+    # DTP - Date or Time Period (Service Date Range)
+    "DTP*291*RD8*{service_date}-{service_date}~",
+    # EQ - Eligibility or Benefit Inquiry (30 = Health Benefit Plan Coverage)
+    "EQ*30~",
+    # SE - Transaction Set Trailer, counting ST through SE inclusive:
+    # ST, BHT, HL, NM1, HL, NM1, HL, TRN, NM1, DMG, DTP, EQ, SE = 13
+    "SE*13*0001~",
+    # GE - Functional Group Trailer
+    "GE*1*{control_number}~",
+    # IEA - Interchange Control Trailer
+    "IEA*1*{control_number}~",
+))
+
+# Same message with the member ID on the subscriber NM1
+_X12_270_TEMPLATE_WITH_MID = _X12_270_TEMPLATE_NO_MID.replace(
+    "NM1*IL*1*{last_name}*{first_name}~", "NM1*IL*1*{last_name}*{first_name}****MI*{member_id}~"
+)
+
+
+class X12_270Builder(X12_270BuilderBase):
     """Builds X12 270 eligibility inquiry messages according to HIPAA 5010 standards"""
     
+    __slots__ = ()
+    
     def __init__(self, config: Dict[str, str]):
         """
         Initialize the builder with configuration
@@ -23,44 +76,38 @@ class X12_270Builder:
                 - provider_name: Provider's name
                 - provider_first_name: Provider's first name (optional)
         """
-        self.config = config
-        self.segment_count = 0
-        self.segments = []
-        
-    def generate_control_number(self, length: int = 9) -> str:
-        """Generate a unique control number"""
-        return str(int(datetime.now().timestamp()))[-length:]
-    
-    def generate_tracking_reference(self) -> str:
-        """Generate a tracking reference number"""
-        timestamp = str(int(datetime.now().timestamp()))
-        random_suffix = str(random.randint(100000, 999999))
-        return f"{timestamp[-8]}-{random_suffix}"
+        super().__init__(config)
     
-    def format_date(self, date: datetime, format_type: str = 'YYMMDD') -> str:
+    def _static_segments(self) -> Tuple[str, str, str, str, str]:
         """
-        Format date according to X12 standards
+        Return the parts of the message that depend only on the config
         
-        Args:
-            date: DateTime object
-            format_type: 'YYMMDD', 'YYYYMMDD', or 'CCYYMMDD'
+        Rendered once and reused until one of the config values they embed
+        changes (main.py switches receiver_id on the shared config for test mode).
+        
+        Returns:
+            Tuple of (ISA sender/receiver IDs, GS prefix, payer NM1, provider NM1, TRN originator)
         """
-        if format_type == 'YYMMDD':
-            return date.strftime('%y%m%d')
-        elif format_type in ['YYYYMMDD', 'CCYYMMDD']:
-            return date.strftime('%Y%m%d')
-        else:
-            raise ValueError(f"Unknown date format: {format_type}")
-    
-    def format_time(self, time: datetime) -> str:
-        """Format time as HHMM for X12"""
-        return time.strftime('%H%M')
+        config = self.config
+        key = (config['trading_partner'], config['receiver_id'],
+               config.get('provider_last', 'PROVIDER'), config.get('provider_first', 'TEST'),
+               config.get('provider_npi'))
+        # Read the cache once: builders may be shared across threads, so another
+        # build can replace self._static between two reads
+        cached_key, parts = self._static
+        if cached_key != key:
+            trading_partner, receiver_id, provider_last, provider_first, _ = key
+            parts = (
+                f"*ZZ*{trading_partner.ljust(15)}*ZZ*{receiver_id.ljust(15)}",
+                f"GS*HS*{trading_partner}*{receiver_id}",
+                f"NM1*PR*2*UTAH MEDICAID FFS*****46*{receiver_id}~",
+                f"NM1*1P*1*{provider_last}*{provider_first}****XX*{config['provider_npi']}~",
+                # TRN originator: first 10 chars of provider NPI (10 chars max for TRN03)
+                config.get('provider_npi', '1275348807')[:10],
+            )
+            self._static = (key, parts)
+        return parts
     
-    def add_segment(self, segment: str):
-        """Add a segment to the message"""
-        self.segments.append(segment)
-        self.segment_count += 1
-        
     def build(self, 
              patient_first_name: str,
              patient_last_name: str,
@@ -84,112 +131,92 @@ class X12_270Builder:
         Returns:
             Complete X12 270 message string
         """
-        self.segments = []
-        self.segment_count = 0
-        
-        # Generate control numbers
-        control_number = self.generate_control_number()
-        tracking_ref1 = self.generate_tracking_reference()
-        tracking_ref2 = f"{int(datetime.now().timestamp())}{random.randint(100, 999)}"
-        
-        # Date/time formatting
-        now = datetime.now()
-        date_6 = self.format_date(now, 'YYMMDD')
-        date_8 = self.format_date(now, 'YYYYMMDD')
-        time_4 = self.format_time(now)
-        
-        # Service date handling
-        if service_date is None:
-            service_date = now
-        service_date_str = self.format_date(service_date, 'YYYYMMDD')
-        
-        # Convert patient DOB from YYYYMMDD string to X12 format
-        if len(patient_dob) == 8:
-            dob_formatted = patient_dob
-        elif len(patient_dob) == 10 and '-' in patient_dob:
-            # Handle YYYY-MM-DD format
-            dob_formatted = patient_dob.replace('-', '')
-        else:
-            raise ValueError(f"Invalid date of birth format: {patient_dob}")
-        
-        # ISA - Interchange Control Header
-        test_flag = 'T' if test_mode else 'P'
-        self.add_segment(
-            f"ISA*00*          *00*          *ZZ*{self.config['trading_partner'].ljust(15)}"
-            f"*ZZ*{self.config['receiver_id'].ljust(15)}"
-            f"*{date_6}*{time_4}*^*00501*{control_number}*1*{test_flag}*:~"
-        )
-        
-        # GS - Functional Group Header
-        self.add_segment(
-            f"GS*HS*{self.config['trading_partner']}*{self.config['receiver_id']}"
-            f"*{date_8}*{time_4}*{control_number}*X*005010X279A1~"
+        return self._build_message(
+            self._clock_fields(), patient_first_name, patient_last_name, patient_dob,
+            patient_gender, member_id, service_date, test_mode
         )
+    
+    def build_many(self, patients: List[Dict], test_mode: bool = False) -> List[str]:
+        """
+        Build a separate X12 270 message for each patient
         
-        # ST - Transaction Set Header
-        self.add_segment("ST*270*0001*005010X279A1~")
-        
-        # BHT - Beginning of Hierarchical Transaction (empty reference field like accepted example)
-        self.add_segment(f"BHT*0022*13**{date_8}*{time_4}~")
+        The clock is read once for the whole list, so every message shares the
+        same date/time fields; each still gets its own control number.
         
-        # HL - Hierarchical Level (Information Source - Payer)
-        self.add_segment("HL*1**20*1~")
+        Args:
+            patients: List of dicts with first_name, last_name, date_of_birth
+                (YYYYMMDD or YYYY-MM-DD), and optional gender and member_id
+            test_mode: If True, uses test flag in ISA segment
         
-        # NM1 - Information Source Name (Payer) - matching accepted format exactly
-        self.add_segment(f"NM1*PR*2*UTAH MEDICAID FFS*****46*{self.config['receiver_id']}~")
+        Returns:
+            X12 270 message strings in patient order
+        """
+        clock = self._clock_fields()
+        return [self._build_patient_message(clock, patient, test_mode) for patient in patients]
+    
+    async def build_many_async(self, patients: List[Dict], test_mode: bool = False) -> AsyncIterator[str]:
+        """
+        Yield a separate X12 270 message for each patient, in patient order
         
-        # HL - Hierarchical Level (Information Receiver - Provider)
-        self.add_segment("HL*2*1*21*1~")
+        Control returns to the event loop after each message, so a caller can
+        start sending it (e.g. with asyncio.create_task) while the rest are
+        still being built. Like build_many, the clock is read once.
         
-        # NM1 - Information Receiver Name (Provider) - using XX qualifier with NPI
-        self.add_segment(
-            f"NM1*1P*1*{self.config.get('provider_last', 'PROVIDER')}*{self.config.get('provider_first', 'TEST')}****XX*{self.config['provider_npi']}~"
+        Args:
+            patients: List of dicts with first_name, last_name, date_of_birth
+                (YYYYMMDD or YYYY-MM-DD), and optional gender and member_id
+            test_mode: If True, uses test flag in ISA segment
+        """
+        clock = self._clock_fields()
+        for patient in patients:
+            yield self._build_patient_message(clock, patient, test_mode)
+            await asyncio.sleep(0)
+    
+    def _build_patient_message(self, clock: Tuple[int, str, str, str], patient: Dict, test_mode: bool) -> str:
+        """Build one X12 270 from a build_many patient dict"""
+        return self._build_message(
+            clock, patient['first_name'], patient['last_name'], patient['date_of_birth'],
+            patient.get('gender', 'U'), patient.get('member_id'), None, test_mode
         )
+    
+    def _build_message(self,
+                       clock: Tuple[int, str, str, str],
+                       patient_first_name: str,
+                       patient_last_name: str,
+                       patient_dob: str,
+                       patient_gender: str,
+                       member_id: Optional[str],
+                       service_date: Optional[datetime],
+                       test_mode: bool) -> str:
+        """Build one X12 270 from pre-read clock fields (see _clock_fields)"""
+        timestamp, date_6, date_8, time_4 = clock
+        isa_ids, gs_prefix, payer_nm1, provider_nm1, originator = self._static_segments()
         
-        # HL - Hierarchical Level (Subscriber/Patient)
-        self.add_segment("HL*3*2*22*0~")
-        
-        # TRN - Trace Number with sender ID as originator (10 chars max for TRN03)
-        # Using first 10 chars of provider NPI as originator reference
-        originator = self.config.get('provider_npi', '1275348807')[:10]
-        self.add_segment(
-            f"TRN*1*{tracking_ref1}*{originator}~"
-        )
+        # Generate control numbers
+        control_number = self.generate_control_number(timestamp=timestamp)
+        tracking_ref1 = self.generate_tracking_reference(timestamp=timestamp)
         
-        # NM1 - Subscriber Name
-        if member_id:
-            self.add_segment(
-                f"NM1*IL*1*{patient_last_name.upper()}*{patient_first_name.upper()}****MI*{member_id}~"
-            )
+        # Service date handling (defaults to today)
+        if service_date is None:
+            service_date_str = date_8
         else:
-            # Without member ID, still include patient name
-            self.add_segment(
-                f"NM1*IL*1*{patient_last_name.upper()}*{patient_first_name.upper()}~"
-            )
-        
-        # DMG - Demographic Information
-        self.add_segment(f"DMG*D8*{dob_formatted}*{patient_gender.upper()}~")
-        
-        # DTP - Date or Time Period (Service Date Range)
-        self.add_segment(f"DTP*291*RD8*{service_date_str}-{service_date_str}~")
-        
-        # EQ - Eligibility or Benefit Inquiry
-        # 30 = Health Benefit Plan Coverage
-        self.add_segment("EQ*30~")
-        
-        # SE - Transaction Set Trailer
-        # Count segments from ST through SE inclusive
-        # ST, BHT, HL, NM1, HL, NM1, HL, TRN, NM1, DMG, DTP, EQ, SE = 13
-        self.add_segment(f"SE*13*0001~")
-        
-        # GE - Functional Group Trailer
-        self.add_segment(f"GE*1*{control_number}~")
-        
-        # IEA - Interchange Control Trailer
-        self.add_segment(f"IEA*1*{control_number}~")
-        
-        # Join all segments with newlines for readability
-        return '\n'.join(self.segments)
+            service_date_str = self.format_date(service_date, 'YYYYMMDD')
+        
+        # Convert patient DOB from YYYYMMDD or YYYY-MM-DD string to X12 format
+        dob_formatted = self._format_dob(patient_dob)
+        
+        template = _X12_270_TEMPLATE_WITH_MID if member_id else _X12_270_TEMPLATE_NO_MID
+        return template.format(
+            isa_ids=isa_ids, gs_prefix=gs_prefix, payer_nm1=payer_nm1, provider_nm1=provider_nm1,
+            date_6=date_6, date_8=date_8, time_4=time_4,
+            control_number=control_number,
+            test_flag='T' if test_mode else 'P',
+            trace_number=tracking_ref1, originator=originator,
+            last_name=patient_last_name.upper(), first_name=patient_first_name.upper(),
+            member_id=member_id,
+            dob=dob_formatted, gender=patient_gender.upper(),
+            service_date=service_date_str
+        )
     
     def validate(self, x12_message: str) -> Dict[str, any]:
         """
@@ -198,51 +225,27 @@ class X12_270Builder:
         Returns:
             Dictionary with validation results
         """
-        results = {
-            'valid': True,
-            'errors': [],
-            'warnings': [],
-            'segment_count': 0
-        }
-        
-        lines = x12_message.strip().split('\n')
-        results['segment_count'] = len(lines)
-        
-        # Check for required segments
-        required_segments = ['ISA', 'GS', 'ST', 'BHT', 'HL', 'NM1', 'EQ', 'SE', 'GE', 'IEA']
-        found_segments = set()
-        
-        for line in lines:
-            # Extract segment ID (first 2-3 characters before *)
-            if '*' in line:
-                segment_id = line.split('*')[0]
-            else:
-                segment_id = line[:3] if len(line) >= 3 else ''
-            
-            if segment_id in required_segments:
-                found_segments.add(segment_id)
-        
-        missing = set(required_segments) - found_segments
-        if missing:
-            results['valid'] = False
-            results['errors'].append(f"Missing required segments: {', '.join(missing)}")
+        # Segment count and required segments
+        message = x12_message.strip()
+        results = self._check_required_segments(message)
         
         # Check ISA segment format
-        if lines and lines[0].startswith('ISA'):
-            isa_parts = lines[0].split('*')
+        first_line = message.partition('\n')[0]
+        if first_line.startswith('ISA'):
+            isa_parts = first_line.split('*')
             if len(isa_parts) != 17:
                 results['errors'].append(f"ISA segment has {len(isa_parts)} elements, expected 17")
                 results['valid'] = False
         
-        # Check for matching control numbers
+        # Check for matching control numbers (only the ISA/IEA lines are split)
         control_numbers = set()
-        for line in lines:
-            if line.startswith('ISA') or line.startswith('GS') or line.startswith('GE') or line.startswith('IEA'):
-                parts = line.split('*')
-                if line.startswith('ISA') and len(parts) > 13:
+        for match in _CONTROL_SEGMENT_RE.finditer(message):
+            parts = match.group().split('*')
+            if match.group(1) == 'ISA':
+                if len(parts) > 13:
                     control_numbers.add(parts[13])
-                elif line.startswith('IEA') and len(parts) > 2:
-                    control_numbers.add(parts[2].rstrip('~'))
+            elif len(parts) > 2:
+                control_numbers.add(parts[2].rstrip('~'))
         
         if len(control_numbers) > 1:
             results['warnings'].append(f"Multiple control numbers found: {control_numbers}")
@@ -4,13 +4,16 @@ Supports Utah Medicaid, U of U Health Plans, and other insurers
 """
 
 from datetime import datetime
-from typing import Dict, Optional, List
-import random
+from typing import Dict, Optional, List, Tuple
 
+from x12_builder_base import X12_270BuilderBase
 
-class X12_270BuilderMulti:
+
+class X12_270BuilderMulti(X12_270BuilderBase):
     """Builds X12 270 eligibility inquiry messages for multiple payers"""
 
+    __slots__ = ('_header',)
+
     def __init__(self, config: Dict[str, str]):
         """
         Initialize the builder with configuration
@@ -25,36 +28,74 @@ class X12_270BuilderMulti:
                 - provider_name: Provider's name
                 - provider_first_name: Provider's first name
         """
-        self.config = config
-        self.segment_count = 0
-        self.segments = []
-
-    def generate_control_number(self, length: int = 9) -> str:
-        """Generate a unique control number"""
-        return str(int(datetime.now().timestamp()))[-length:]
-
-    def generate_tracking_reference(self) -> str:
-        """Generate a tracking reference number"""
-        timestamp = str(int(datetime.now().timestamp()))
-        random_suffix = str(random.randint(100000, 999999))
-        return f"{timestamp[-8]}-{random_suffix}"
+        super().__init__(config)
+        # (config/clock key, rendered ISA/GS/BHT text), see _header_prefix
+        self._header = (None, None)
 
     def format_date(self, date: datetime, format_type: str = 'YYMMDD') -> str:
         """Format date according to X12 standards"""
         if format_type == 'YYMMDD':
-            return date.strftime('%y%m%d')
-        elif format_type in ['YYYYMMDD', 'CCYYMMDD']:
-            return date.strftime('%Y%m%d')
-        return date.strftime('%Y%m%d')
+            return f"{date.year % 100:02d}{date.month:02d}{date.day:02d}"
+        # YYYYMMDD / CCYYMMDD, and the fallback for any other format type
+        return f"{date.year:04d}{date.month:02d}{date.day:02d}"
+
+    def _static_segments(self) -> Tuple[str, str, str, str, str]:
+        """
+        Return the parts of the message that depend only on the payer/provider config
 
-    def format_time(self, time: datetime) -> str:
-        """Format time as HHMM for X12 standards"""
-        return time.strftime('%H%M')
+        Rendered once and reused until one of the config values they embed changes.
 
-    def add_segment(self, segment: str):
-        """Add a segment to the message and increment counter"""
-        self.segments.append(segment)
-        self.segment_count += 1
+        Returns:
+            Tuple of (ISA sender/receiver IDs, GS prefix, payer NM1, provider NM1, TRN originator)
+        """
+        config = self.config
+        key = (config['trading_partner'], config['receiver_id'],
+               config.get('payer_name', 'UNKNOWN PAYER'), config.get('provider_name', 'PROVIDER'),
+               config.get('provider_first_name', ''), config.get('provider_npi'))
+        # Read the cache once: builders may be shared across threads, so another
+        # build can replace self._static between two reads
+        cached_key, parts = self._static
+        if cached_key != key:
+            trading_partner, receiver_id, payer_name, provider_last, provider_first, _ = key
+            if provider_first:
+                provider_nm1 = f"NM1*1P*1*{provider_last}*{provider_first}****XX*{config['provider_npi']}~"
+            else:
+                # Organization format if no first name
+                provider_nm1 = f"NM1*1P*2*{provider_last}*****XX*{config['provider_npi']}~"
+            parts = (
+                f"*ZZ*{trading_partner.ljust(15)}*ZZ*{receiver_id.ljust(15)}",
+                f"GS*HS*{trading_partner}*{receiver_id}",
+                # Use receiver ID with 46 qualifier (standard for UHIN)
+                f"NM1*PR*2*{payer_name}*****46*{receiver_id}~",
+                provider_nm1,
+                config.get('provider_npi', '1234567890')[:10],
+            )
+            self._static = (key, parts)
+        return parts
+
+    def _header_prefix(self, date_6: str, date_8: str, time_4: str) -> Tuple[str, str, str]:
+        """
+        Return the ISA and GS text up to the control number, and the BHT segment
+
+        These only change with the config and the clock minute, so consecutive
+        builds within a minute reuse one rendering.
+
+        Returns:
+            Tuple of (ISA prefix, GS prefix, BHT segment)
+        """
+        isa_ids, gs_prefix = self._static_segments()[:2]
+        key = (isa_ids, gs_prefix, date_6, date_8, time_4)
+        # Read the cache once: builders are shared across threads, so another
+        # build may replace self._header between two reads
+        cached_key, header = self._header
+        if cached_key != key:
+            header = (
+                f"ISA*00*          *00*          {isa_ids}*{date_6}*{time_4}*^*00501*",
+                f"{gs_prefix}*{date_8}*{time_4}*",
+                f"BHT*0022*13**{date_8}*{time_4}~",
+            )
+            self._header = (key, header)
+        return header
 
     def build(self,
              patient_first_name: str,
@@ -81,164 +122,102 @@ class X12_270BuilderMulti:
         Returns:
             Complete X12 270 message string
         """
-        self.segments = []
-        self.segment_count = 0
+        segments = []
 
-        # Generate control numbers
-        control_number = self.generate_control_number()
-        tracking_ref = self.generate_tracking_reference()
+        # One clock read for the control numbers and every date/time field
+        timestamp, date_6, date_8, time_4 = self._clock_fields()
 
-        # Date/time formatting
-        now = datetime.now()
-        date_6 = self.format_date(now, 'YYMMDD')
-        date_8 = self.format_date(now, 'YYYYMMDD')
-        time_4 = self.format_time(now)
+        # Generate control numbers
+        control_number = self.generate_control_number(timestamp=timestamp)
+        tracking_ref = self.generate_tracking_reference(timestamp=timestamp)
 
-        # Service date handling
+        # Service date handling (defaults to today)
         if service_date is None:
-            service_date = now
-        service_date_str = self.format_date(service_date, 'YYYYMMDD')
-
-        # Convert patient DOB to proper format
-        if len(patient_dob) == 8:
-            dob_formatted = patient_dob
-        elif len(patient_dob) == 10 and '-' in patient_dob:
-            dob_formatted = patient_dob.replace('-', '')
+            service_date_str = date_8
         else:
-            raise ValueError(f"Invalid date of birth format: {patient_dob}")
+            service_date_str = self.format_date(service_date, 'YYYYMMDD')
 
-        # Ensure gender is valid
-        if patient_gender not in ['M', 'F']:
-            patient_gender = 'M'  # Default to M if unknown
+        # Convert patient DOB to proper format
+        dob_formatted = self._format_dob(patient_dob)
 
         # Default eligibility segments
         if not eligibility_segments:
             eligibility_segments = ['30']  # Default: Health Benefit Plan Coverage
 
-        # Get payer info from config
-        payer_name = self.config.get('payer_name', 'UNKNOWN PAYER')
-        payer_code = self.config.get('payer_code', self.config.get('receiver_id', ''))
+        # Ensure gender is valid
+        if patient_gender not in ['M', 'F']:
+            patient_gender = 'M'  # Default to M if unknown
+
+        # Config-only segments and the ISA/GS/BHT parts for this minute
+        _, _, payer_nm1, provider_nm1, originator = self._static_segments()
+        isa_prefix, gs_prefix, bht = self._header_prefix(date_6, date_8, time_4)
 
         # ISA - Interchange Control Header
         test_flag = 'T' if test_mode else 'P'
-        self.add_segment(
-            f"ISA*00*          *00*          *ZZ*{self.config['trading_partner'].ljust(15)}"
-            f"*ZZ*{self.config['receiver_id'].ljust(15)}"
-            f"*{date_6}*{time_4}*^*00501*{control_number}*1*{test_flag}*:~"
-        )
+        segments.append(f"{isa_prefix}{control_number}*1*{test_flag}*:~")
 
         # GS - Functional Group Header
-        self.add_segment(
-            f"GS*HS*{self.config['trading_partner']}*{self.config['receiver_id']}"
-            f"*{date_8}*{time_4}*{control_number}*X*005010X279A1~"
-        )
+        segments.append(f"{gs_prefix}{control_number}*X*005010X279A1~")
 
         # ST - Transaction Set Header
-        self.add_segment("ST*270*0001*005010X279A1~")
+        segments.append("ST*270*0001*005010X279A1~")
 
         # BHT - Beginning of Hierarchical Transaction
-        self.add_segment(f"BHT*0022*13**{date_8}*{time_4}~")
+        segments.append(bht)
 
         # HL - Hierarchical Level (Information Source - Payer)
-        self.add_segment("HL*1**20*1~")
+        segments.append("HL*1**20*1~")
 
         # NM1 - Information Source Name (Payer)
-        # Use receiver ID with 46 qualifier (standard for UHIN)
-        self.add_segment(f"NM1*PR*2*{payer_name}*****46*{self.config['receiver_id']}~")
+        segments.append(payer_nm1)
 
         # HL - Hierarchical Level (Information Receiver - Provider)
-        self.add_segment("HL*2*1*21*1~")
+        segments.append("HL*2*1*21*1~")
 
         # NM1 - Information Receiver Name (Provider)
-        provider_last = self.config.get('provider_name', 'PROVIDER')
-        provider_first = self.config.get('provider_first_name', '')
-        if provider_first:
-            self.add_segment(
-                f"NM1*1P*1*{provider_last}*{provider_first}****XX*{self.config['provider_npi']}~"
-            )
-        else:
-            # Organization format if no first name
-            self.add_segment(
-                f"NM1*1P*2*{provider_last}*****XX*{self.config['provider_npi']}~"
-            )
+        segments.append(provider_nm1)
 
         # HL - Hierarchical Level (Subscriber/Patient)
-        self.add_segment("HL*3*2*22*0~")
+        segments.append("HL*3*2*22*0~")
 
         # TRN - Trace Number
-        originator = self.config.get('provider_npi', '1234567890')[:10]
-        self.add_segment(f"TRN*1*{tracking_ref}*{originator}~")
+        segments.append(f"TRN*1*{tracking_ref}*{originator}~")
 
-        # NM1 - Subscriber Name
+        # NM1 - Subscriber Name (without member ID, still need the NM1 segment)
+        subscriber_nm1 = f"NM1*IL*1*{patient_last_name.upper()}*{patient_first_name.upper()}"
         if member_id:
-            self.add_segment(
-                f"NM1*IL*1*{patient_last_name.upper()}*{patient_first_name.upper()}****MI*{member_id}~"
-            )
+            segments.append(f"{subscriber_nm1}****MI*{member_id}~")
         else:
-            # Without member ID, still need the NM1 segment
-            self.add_segment(
-                f"NM1*IL*1*{patient_last_name.upper()}*{patient_first_name.upper()}~"
-            )
+            segments.append(f"{subscriber_nm1}~")
 
-        # DMG - Demographic Information
-        self.add_segment(f"DMG*D8*{dob_formatted}*{patient_gender.upper()}~")
+        # DMG - Demographic Information (gender is already 'M' or 'F')
+        segments.append(f"DMG*D8*{dob_formatted}*{patient_gender}~")
 
         # DTP - Date or Time Period (Service Date Range)
-        self.add_segment(f"DTP*291*RD8*{service_date_str}-{service_date_str}~")
+        segments.append(f"DTP*291*RD8*{service_date_str}-{service_date_str}~")
 
         # EQ - Eligibility or Benefit Inquiry
         # Support multiple eligibility segments if specified
-        eq_segments_added = 0
-        for eq_code in eligibility_segments:
-            self.add_segment(f"EQ*{eq_code}~")
-            eq_segments_added += 1
+        segments.extend([f"EQ*{eq_code}~" for eq_code in eligibility_segments])
 
         # Calculate segment count
         # ISA and IEA don't count, GS and GE don't count
         # Count from ST to SE inclusive
         # ST, BHT, HL, NM1, HL, NM1, HL, TRN, NM1, DMG, DTP, EQ(s), SE
-        segment_count = 12 + eq_segments_added  # Base segments + EQ segments + SE itself
+        segment_count = 12 + len(eligibility_segments)  # Base segments + EQ segments + SE itself
 
         # SE - Transaction Set Trailer
-        self.add_segment(f"SE*{segment_count}*0001~")
+        segments.append(f"SE*{segment_count}*0001~")
 
         # GE - Functional Group Trailer
-        self.add_segment(f"GE*1*{control_number}~")
+        segments.append(f"GE*1*{control_number}~")
 
         # IEA - Interchange Control Trailer
-        self.add_segment(f"IEA*1*{control_number}~")
+        segments.append(f"IEA*1*{control_number}~")
 
         # Join all segments with newlines for readability
-        return '\n'.join(self.segments)
+        return '\n'.join(segments)
 
     def validate(self, x12_message: str) -> Dict[str, any]:
         """Validate an X12 270 message for common issues"""
-        results = {
-            'valid': True,
-            'errors': [],
-            'warnings': [],
-            'segment_count': 0
-        }
-
-        lines = x12_message.strip().split('\n')
-        results['segment_count'] = len(lines)
-
-        # Check for required segments
-        required_segments = ['ISA', 'GS', 'ST', 'BHT', 'HL', 'NM1', 'EQ', 'SE', 'GE', 'IEA']
-        found_segments = set()
-
-        for line in lines:
-            if '*' in line:
-                segment_id = line.split('*')[0]
-            else:
-                segment_id = line[:3] if len(line) >= 3 else ''
-
-            if segment_id in required_segments:
-                found_segments.add(segment_id)
-
-        missing = set(required_segments) - found_segments
-        if missing:
-            results['valid'] = False
-            results['errors'].append(f"Missing required segments: {', '.join(missing)}")
-
-        return results
\ No newline at end of file
+        return self._check_required_segments(x12_message.strip())
\ No newline at end of file
@@ -2,16 +2,80 @@
 Utah Medicaid Specific X12 270 Message Builder
 Based on web Claude's analysis of UTRANSEND requirements
 Utah Medicaid requires minimal format with many elements marked as "Not Used"
+Each build is one str.format() call on a module-level template, which already
+runs in C; numba.jit would gain nothing here (no nopython string support)
 """
 
-from datetime import datetime
-from typing import Dict, Optional
-import random
+from typing import Dict, Optional, Tuple
 
+from x12_builder_base import X12_270BuilderBase
 
-class UtahMedicaidX12_270Builder:
+# Deletes the dashes from a YYYY-MM-DD date of birth in one pass
+_NO_DASH = str.maketrans('', '', '-')
+
+# ISA through the provider HL, shared by both templates below.
+# Config-only segment parts come from UtahMedicaidX12_270Builder._static_segments.
+_HEADER_270_SEGMENTS = (
+    # ISA - Interchange Control Header
+    "ISA*00*          *00*          {isa_ids}*{date_6}*{time_4}*^*00501*{control_number}*0*{test_flag}*:~",
+    # GS - Functional Group Header
+    "{gs_prefix}*{date_8}*{time_4}*{control_number}*X*005010X279A1~",
+    # ST - Transaction Set Header
+    "ST*270*0001*005010X279A1~",
+    # BHT - Beginning of Hierarchical Transaction
+    "BHT*0022*13**{date_8}*{time_4}~",
+    # HL - Hierarchical Level (Payer)
+    "HL*1**20*1~",
+    # NM1 - Payer Name (Utah Medicaid FFS)
+    "{payer_nm1}",
+    # HL - Hierarchical Level (Provider)
+    "HL*2*1*21*1~",
+)
+
+# Minimal 270: 13 segments from ST to SE, joined with newlines for readability
+_MINIMAL_270_TEMPLATE = '\n'.join(_HEADER_270_SEGMENTS + (
+    # NM1 - Provider Name (using XX qualifier with NPI)
+    "NM1*1P*1*{provider_last_name}*{provider_first_name}****XX*{provider_npi}~",
+    # HL - Hierarchical Level (Subscriber)
+    "HL*3*2*22*0~",
+    # TRN - Trace Number with provider NPI as originator
+    "TRN*1*{trace_number}*{originator}~",
+    # NM1 - Subscriber Name
+    "NM1*IL*1*{subscriber_name}~",
+    # DMG - Demographics
+    "DMG*D8*{dob}*{gender}~",
+    # DTP - Date/Time Period (Service Date)
+    "DTP*291*RD8*{date_8}-{date_8}~",
+    # EQ - Eligibility/Benefit Inquiry
+    "EQ*30~",
+    # SE - Transaction Set Trailer (13 segments from ST to SE)
+    "SE*13*0001~",
+    # GE - Functional Group Trailer
+    "GE*1*{control_number}~",
+    # IEA - Interchange Control Trailer
+    "IEA*1*{control_number}~",
+))
+
+# Ultra minimal 270: provider as organization, no TRN or DTP (11 segments ST to SE)
+_ULTRA_MINIMAL_270_TEMPLATE = '\n'.join(_HEADER_270_SEGMENTS + (
+    # NM1 - Provider as ORGANIZATION (entity type 2)
+    "NM1*1P*2*PROVIDER~",
+    # HL/NM1 - Subscriber (NO TRN segment at all)
+    "HL*3*2*22*0~",
+    "NM1*IL*1*{subscriber_name}~",
+    "DMG*D8*{dob}*{gender}~",
+    "EQ*30~",
+    "SE*11*0001~",
+    "GE*1*{control_number}~",
+    "IEA*1*{control_number}~",
+))
+
+
+class UtahMedicaidX12_270Builder(X12_270BuilderBase):
     """Builds minimal X12 270 messages specifically for Utah Medicaid FFS"""
     
+    __slots__ = ()
+    
     def __init__(self, config: Dict[str, str]):
         """
         Initialize with configuration
@@ -21,25 +85,44 @@ class UtahMedicaidX12_270Builder:
                 - trading_partner: UHIN Trading Partner Number
                 - receiver_id: Utah Medicaid receiver ID
         """
-        self.config = config
-        self.segments = []
-        
-    def generate_control_number(self, length: int = 9) -> str:
-        """Generate a unique control number"""
-        return str(int(datetime.now().timestamp()))[-length:]
-    
-    def format_date(self, date: datetime, format_type: str = 'YYMMDD') -> str:
-        """Format date according to X12 standards"""
-        if format_type == 'YYMMDD':
-            return date.strftime('%y%m%d')
-        elif format_type in ['YYYYMMDD', 'CCYYMMDD']:
-            return date.strftime('%Y%m%d')
-        else:
-            raise ValueError(f"Unknown date format: {format_type}")
+        super().__init__(config)
     
-    def format_time(self, time: datetime) -> str:
-        """Format time as HHMM for X12"""
-        return time.strftime('%H%M')
+    def _static_segments(self) -> Tuple[str, str, str, str, str]:
+        """
+        Return the parts of the message that depend only on the config
+        
+        Rendered once and reused until one of the config values they embed changes.
+        
+        Returns:
+            Tuple of (ISA sender/receiver IDs, GS prefix, payer NM1, provider NPI, TRN originator)
+        """
+        config = self.config
+        key = (config['trading_partner'], config['receiver_id'], config.get('provider_npi', '1275348807'))
+        # Read the cache once: builders may be shared across threads, so another
+        # build can replace self._static between two reads
+        cached_key, parts = self._static
+        if cached_key != key:
+            trading_partner, receiver_id, provider_npi = key
+            parts = (
+                f"*ZZ*{trading_partner.ljust(15)}*ZZ*{receiver_id.ljust(15)}",
+                f"GS*HS*{trading_partner}*{receiver_id}",
+                f"NM1*PR*2*UTAH MEDICAID FFS*****46*{receiver_id}~",
+                provider_npi,
+                # Provider NPI doubles as the TRN originator (10 chars max for TRN03)
+                provider_npi[:10],
+            )
+            self._static = (key, parts)
+        return parts
+        
+    def _now_fields(self) -> Tuple[str, str, str, str]:
+        """
+        Read the clock once for the control number and ISA/GS/BHT dates
+        
+        Returns:
+            Tuple of (control_number, YYMMDD, CCYYMMDD, HHMM), all from the same instant
+        """
+        timestamp, date_6, date_8, time_4 = self._clock_fields()
+        return self.generate_control_number(timestamp=timestamp), date_6, date_8, time_4
     
     def build(self, 
              patient_first_name: str,
@@ -58,91 +141,29 @@ class UtahMedicaidX12_270Builder:
         - Single TRN segment with ONLY trace number (no additional qualifiers)
         - 12 total segments between ST and SE
         """
-        self.segments = []
-        
         # Generate control numbers
-        control_number = self.generate_control_number()
-        now = datetime.now()
-        date_6 = self.format_date(now, 'YYMMDD')
-        date_8 = self.format_date(now, 'YYYYMMDD')
-        time_4 = self.format_time(now)
-        
-        # Format patient DOB
-        if '-' in patient_dob:
-            dob_formatted = patient_dob.replace('-', '')
-        else:
-            dob_formatted = patient_dob
-        
-        # ISA - Interchange Control Header
-        test_flag = 'T' if test_mode else 'P'
-        self.segments.append(
-            f"ISA*00*          *00*          *ZZ*{self.config['trading_partner'].ljust(15)}"
-            f"*ZZ*{self.config['receiver_id'].ljust(15)}"
-            f"*{date_6}*{time_4}*^*00501*{control_number}*0*{test_flag}*:~"
-        )
-        
-        # GS - Functional Group Header
-        self.segments.append(
-            f"GS*HS*{self.config['trading_partner']}*{self.config['receiver_id']}"
-            f"*{date_8}*{time_4}*{control_number}*X*005010X279A1~"
+        control_number, date_6, date_8, time_4 = self._now_fields()
+        
+        # Format patient DOB (YYYY-MM-DD or YYYYMMDD)
+        dob_formatted = patient_dob.translate(_NO_DASH)
+        
+        # Provider NPI (XX qualifier, defaults to known NPI) and TRN originator
+        isa_ids, gs_prefix, payer_nm1, provider_npi, originator = self._static_segments()
+        
+        return _MINIMAL_270_TEMPLATE.format(
+            isa_ids=isa_ids, gs_prefix=gs_prefix, payer_nm1=payer_nm1,
+            date_6=date_6, date_8=date_8, time_4=time_4,
+            control_number=control_number,
+            test_flag='T' if test_mode else 'P',
+            provider_last_name=provider_last_name,
+            provider_first_name=provider_first_name,
+            provider_npi=provider_npi,
+            trace_number=f"{control_number[:8]}{control_number[-6:]}",
+            originator=originator,
+            subscriber_name=self._subscriber_name(patient_first_name, patient_last_name, member_id),
+            dob=dob_formatted,
+            gender=patient_gender.upper()
         )
-        
-        # ST - Transaction Set Header
-        self.segments.append("ST*270*0001*005010X279A1~")
-        
-        # BHT - Beginning of Hierarchical Transaction
-        self.segments.append(f"BHT*0022*13**{date_8}*{time_4}~")
-        
-        # HL - Hierarchical Level (Payer)
-        self.segments.append("HL*1**20*1~")
-        
-        # NM1 - Payer Name (Utah Medicaid FFS)
-        self.segments.append(f"NM1*PR*2*UTAH MEDICAID FFS*****46*{self.config['receiver_id']}~")
-        
-        # HL - Hierarchical Level (Provider)
-        self.segments.append("HL*2*1*21*1~")
-        
-        # NM1 - Provider Name (using XX qualifier with NPI)
-        provider_npi = self.config.get('provider_npi', '1275348807')  # Default to known NPI
-        self.segments.append(f"NM1*1P*1*{provider_last_name}*{provider_first_name}****XX*{provider_npi}~")
-        
-        # HL - Hierarchical Level (Subscriber)
-        self.segments.append("HL*3*2*22*0~")
-        
-        # TRN - Trace Number with provider NPI as originator (10 chars max for TRN03)
-        trace_number = f"{control_number[:8]}{control_number[-6:]}"
-        originator = self.config.get('provider_npi', '1275348807')[:10]
-        self.segments.append(f"TRN*1*{trace_number}*{originator}~")
-        
-        # NM1 - Subscriber Name
-        if member_id:
-            self.segments.append(
-                f"NM1*IL*1*{patient_last_name.upper()}*{patient_first_name.upper()}****MI*{member_id}~"
-            )
-        else:
-            self.segments.append(
-                f"NM1*IL*1*{patient_last_name.upper()}*{patient_first_name.upper()}~"
-            )
-        
-        # DMG - Demographics
-        self.segments.append(f"DMG*D8*{dob_formatted}*{patient_gender.upper()}~")
-        
-        # DTP - Date/Time Period (Service Date)
-        self.segments.append(f"DTP*291*RD8*{date_8}-{date_8}~")
-        
-        # EQ - Eligibility/Benefit Inquiry
-        self.segments.append("EQ*30~")
-        
-        # SE - Transaction Set Trailer (13 segments from ST to SE)
-        self.segments.append("SE*13*0001~")
-        
-        # GE - Functional Group Trailer
-        self.segments.append(f"GE*1*{control_number}~")
-        
-        # IEA - Interchange Control Trailer
-        self.segments.append(f"IEA*1*{control_number}~")
-        
-        return '\n'.join(self.segments)
     
     def build_ultra_minimal(self, 
                            patient_first_name: str,
@@ -155,76 +176,25 @@ class UtahMedicaidX12_270Builder:
         - Provider as organization (not individual)
         - No TRN segment at all
         """
-        self.segments = []
+        control_number, date_6, date_8, time_4 = self._now_fields()
         
-        control_number = self.generate_control_number()
-        now = datetime.now()
-        date_6 = self.format_date(now, 'YYMMDD')
-        date_8 = self.format_date(now, 'YYYYMMDD')
-        time_4 = self.format_time(now)
+        dob_formatted = patient_dob.translate(_NO_DASH)
         
-        if '-' in patient_dob:
-            dob_formatted = patient_dob.replace('-', '')
-        else:
-            dob_formatted = patient_dob
+        isa_ids, gs_prefix, payer_nm1 = self._static_segments()[:3]
         
-        # ISA
-        self.segments.append(
-            f"ISA*00*          *00*          *ZZ*{self.config['trading_partner'].ljust(15)}"
-            f"*ZZ*{self.config['receiver_id'].ljust(15)}"
-            f"*{date_6}*{time_4}*^*00501*{control_number}*0*P*:~"
+        return _ULTRA_MINIMAL_270_TEMPLATE.format(
+            isa_ids=isa_ids, gs_prefix=gs_prefix, payer_nm1=payer_nm1,
+            date_6=date_6, date_8=date_8, time_4=time_4,
+            control_number=control_number,
+            test_flag='P',  # Ultra minimal is always sent as production
+            subscriber_name=self._subscriber_name(patient_first_name, patient_last_name, member_id),
+            dob=dob_formatted,
+            gender=patient_gender.upper()
         )
-        
-        # GS
-        self.segments.append(
-            f"GS*HS*{self.config['trading_partner']}*{self.config['receiver_id']}"
-            f"*{date_8}*{time_4}*{control_number}*X*005010X279A1~"
-        )
-        
-        # ST
-        self.segments.append("ST*270*0001*005010X279A1~")
-        
-        # BHT
-        self.segments.append(f"BHT*0022*13**{date_8}*{time_4}~")
-        
-        # HL - Payer
-        self.segments.append("HL*1**20*1~")
-        
-        # NM1 - Payer
-        self.segments.append(f"NM1*PR*2*UTAH MEDICAID FFS*****46*{self.config['receiver_id']}~")
-        
-        # HL - Provider
-        self.segments.append("HL*2*1*21*1~")
-        
-        # NM1 - Provider as ORGANIZATION (entity type 2)
-        self.segments.append("NM1*1P*2*PROVIDER~")
-        
-        # HL - Subscriber
-        self.segments.append("HL*3*2*22*0~")
-        
-        # NM1 - Subscriber (NO TRN segment at all)
+    
+    def _subscriber_name(self, first_name: str, last_name: str, member_id: Optional[str]) -> str:
+        """NM1*IL elements after the entity type, with the MI member ID when known"""
+        name = f"{last_name.upper()}*{first_name.upper()}"
         if member_id:
-            self.segments.append(
-                f"NM1*IL*1*{patient_last_name.upper()}*{patient_first_name.upper()}****MI*{member_id}~"
-            )
-        else:
-            self.segments.append(
-                f"NM1*IL*1*{patient_last_name.upper()}*{patient_first_name.upper()}~"
-            )
-        
-        # DMG
-        self.segments.append(f"DMG*D8*{dob_formatted}*{patient_gender.upper()}~")
-        
-        # EQ
-        self.segments.append("EQ*30~")
-        
-        # SE - Only 11 segments now (no TRN, no DTP)
-        self.segments.append("SE*11*0001~")
-        
-        # GE
-        self.segments.append(f"GE*1*{control_number}~")
-        
-        # IEA
-        self.segments.append(f"IEA*1*{control_number}~")
-        
-        return '\n'.join(self.segments)
\ No newline at end of file
+            return f"{name}****MI*{member_id}"
+        return name